@@ -0,0 +1,2 @@
+"""Benchmarks of the sweep stages, see benchsweep.py
+"""
@@ -0,0 +1,126 @@
+"""Startup time of the tape5-generation and run-only entry points.
+
+Each shard of a sweep on a cluster starts a fresh interpreter, so the
+import time of the entry point is paid per job.  The entry points in
+stdatmos/runsweep.py are started in a fresh interpreter on an empty sweep
+(no cases), so that only the startup is timed: the imports, argument
+parsing and reading the spec.  The time above that of a bare interpreter
+(python -c pass) is checked against startupBudget, best of --repeat starts.
+
+The modules imported by each entry point are listed with python -X importtime,
+none of heavyModules may be imported.
+
+  python -m benchmarks.benchstartup --repeat 20 --output startup.json
+
+Exits with status 1 if an entry point is over its budget or imports a
+heavy module.  Run from the repository root.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchmarks.benchsweep as benchsweep
+
+#seconds above the bare interpreter startup
+startupBudget = {'tape5':0.1, 'run':0.2}
+
+#python arguments of the entry points, SPEC is replaced by the spec file
+entryPoints = {
+  'tape5':['-m', 'stdatmos.runsweep', 'SPEC', '--tape5'],
+  'run':['-m', 'stdatmos.runsweep', 'SPEC', '--run', 'modtran'],
+  }
+
+#modules that must not be imported by the entry points
+heavyModules = ['numpy', 'scipy', 'pandas', 'matplotlib', 'xlsxwriter', 'pyradi']
+
+#a sweep without cases
+emptySpec = {'name':'startup', 'kind':'elev', 'atmospheres':[], 'altitudes':[0], 'geometries':[0]}
+
+###############################################################
+def entryCommand(name, specfile):
+  return [sys.executable] + [specfile if arg == 'SPEC' else arg for arg in entryPoints[name]]
+
+###############################################################
+def startTime(command, workdir, env):
+  """Returns the wall time in seconds to run command to completion
+  """
+  start = time.perf_counter()
+  subprocess.run(command, cwd=workdir, env=env, check=True, stdout=subprocess.DEVNULL)
+  return time.perf_counter() - start
+
+###############################################################
+def importedModules(command, workdir, env):
+  """Returns the top level names of the modules imported by command
+  """
+  process = subprocess.run(command[:1] + ['-X', 'importtime'] + command[1:], cwd=workdir, env=env,
+    check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+  modules = set()
+  for line in process.stderr.splitlines():
+    if line.startswith('import time:') and not line.rstrip().endswith('package'):
+      modules.add(line.split('|')[-1].strip().split('.')[0])
+  return modules
+
+###############################################################
+def runBenchmarks(names=None, repeat=10):
+  """Times the startup of the entry points, returns the results as a dict.
+  Each result has the entry point, the best startup time above the bare
+  interpreter, the budget and the heavy modules imported.
+  """
+  if names is None:
+    names = sorted(entryPoints)
+  workdir = tempfile.mkdtemp(prefix='benchstartup')
+  env = dict(os.environ)
+  env['PYTHONPATH'] = os.pathsep.join([benchsweep.repoDir] +
+    ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+  results = []
+  try:
+    specfile = os.path.join(workdir, 'startup.json')
+    with open(specfile, 'wt') as fout:
+      json.dump(emptySpec, fout)
+    baseline = min([startTime([sys.executable, '-c', 'pass'], workdir, env) for i in range(repeat)])
+    for name in names:
+      command = entryCommand(name, specfile)
+      times = [startTime(command, workdir, env) for i in range(repeat)]
+      heavy = sorted(importedModules(command, workdir, env).intersection(heavyModules))
+      result = {'entry':name, 'seconds':times, 'best':min(times), 'startup':min(times) - baseline,
+        'budget':startupBudget[name], 'heavy':heavy}
+      result['ok'] = result['startup'] <= result['budget'] and not heavy
+      results.append(result)
+      print(formatResult(result))
+      sys.stdout.flush()
+  finally:
+    shutil.rmtree(workdir, ignore_errors=True)
+
+  return {'commit':benchsweep.gitCommit(), 'timestamp':time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'python':platform.python_version(), 'platform':platform.platform(), 'repeat':repeat,
+    'baseline':baseline, 'results':results}
+
+###############################################################
+def formatResult(result):
+  text = '{:6s} {:8.3f} s startup, budget {:.3f} s'.format(result['entry'], result['startup'],
+    result['budget'])
+  if result['heavy']:
+    text += ', imports {}'.format(' '.join(result['heavy']))
+  return text + ('' if result['ok'] else '  OVER BUDGET')
+
+##########################################################################################################
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Startup time of the sweep entry points')
+  parser.add_argument('--entries', nargs='+', choices=sorted(entryPoints), default=None)
+  parser.add_argument('--repeat', type=int, default=10)
+  parser.add_argument('--output', default='benchstartup.json')
+  args = parser.parse_args()
+
+  report = runBenchmarks(args.entries, args.repeat)
+  with open(args.output, 'wt') as fout:
+    json.dump(report, fout, indent=1)
+  print('results written to {}'.format(args.output))
+  if not all([result['ok'] for result in report['results']]):
+    sys.exit(1)
@@ -0,0 +1,346 @@
+"""Benchmarks of the sweep stages, on synthetic fixtures.
+
+Each stage of a sweep is timed at a number of sizes (cases per sweep):
+
+  tape5      sweep.writeCase, one tape5 per case
+  launch     scheduler.runJobs with stubmodtran in place of modtran:
+             process launch, scratch directory and copy back of tape6/tape7
+  copy       cache.ResultCache store and fetch of the tape6/tape7
+  loadtape7  tape7store.loadTape7 (pyradi.rymodtran.loadtape7)
+  integrate  pipeline.integrateCases over the standard spectral ranges
+  tau1km     tau1km.tau1kmBatch, the 1 km transmittance of domodtran.py
+  plot       plotting.plotTau, the plots of domodtran.py
+  writexls   export.writeTau1km, the spreadsheets of domodtran.py
+  exportxls  resultstore.ResultStore.exportExcel of the elevation results
+
+The fixtures are tape5/tape7 files written by stubmodtran, on a 1 cm-1
+grid from 400 to 40000 cm-1 (39601 samples, the size of a real tape7).
+The case directories share one tape7 through hard links, to keep the
+fixtures for the large sizes small on disk.
+
+Stages whose dependencies are not installed (e.g. pyradi) are skipped and
+recorded as such.  Stages that write a file per case have a size limit
+(stageLimits), lift it with --nolimit.
+
+The results are written as JSON, with the git commit, python and numpy
+versions, so that runs of different versions can be compared:
+
+  python -m benchmarks.benchsweep --sizes 1 10 100 1000 --output bench.json
+  python -m benchmarks.benchsweep --compare old.json new.json
+
+Run from the repository root.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+import stdatmos.stubmodtran as stubmodtran
+import stdatmos.sweep as sweep
+import stdatmos.tape5 as tape5
+
+repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+templateFile = os.path.join(repoDir, 'TropicalRural', 'TropicalRural.ltn')
+specRangesFile = os.path.join(repoDir, 'data', 'StandardSpectralRanges.txt')
+fixtureGrid = (400., 40000., 1.) #V1, V2, DV in cm-1
+scenario = 'Bench'
+
+stageNames = ['tape5', 'launch', 'copy', 'loadtape7', 'integrate', 'tau1km',
+  'plot', 'writexls', 'exportxls']
+#largest size for the stages that write files per case
+stageLimits = {'launch':100, 'copy':100, 'plot':100, 'writexls':1000}
+
+###############################################################
+def fixtureTape5(template=templateFile, grid=fixtureGrid):
+  """Returns the tape5 lines of the template, with the spectral range
+  and resolution in CARD4 set to the fixture grid
+  """
+  v1, v2, dv = grid
+  return tape5.readTape5(template).render(V1=v1, V2=v2, DV=dv).splitlines(True)
+
+###############################################################
+def fixtureAlts(n):
+  """Returns n altitudes in m
+  """
+  return [305 + 10 * i for i in range(n)]
+
+###############################################################
+def readSpecRanges(filename=specRangesFile):
+  specranges = {}
+  with open(filename, 'rt') as fin:
+    for line in fin.readlines():
+      linelst = line.rstrip().split()
+      if linelst:
+        specranges[linelst[0]] = [float(linelst[1]), float(linelst[2])]
+  return specranges
+
+###############################################################
+def linkFile(src, dst):
+  """Hard links src to dst, or copies if hard links are not supported
+  """
+  if os.path.exists(dst):
+    os.remove(dst)
+  try:
+    os.link(src, dst)
+  except (OSError, AttributeError):
+    shutil.copyfile(src, dst)
+
+###############################################################
+class Fixture(object):
+  """Synthetic sweep of up to n cases in workdir/Bench/<alt>,
+  all sharing the stub tape7 of the first case
+  """
+
+  def __init__(self, workdir):
+    self.workdir = workdir
+    self.scenariodir = os.path.join(workdir, scenario)
+    self.lines = fixtureTape5()
+    self.ncases = 0
+    if not os.path.exists(self.scenariodir):
+      os.makedirs(self.scenariodir)
+    with open(os.path.join(self.scenariodir, 'tape5'), 'wt') as fout:
+      fout.writelines(self.lines)
+
+  def datadirs(self, n):
+    return [os.path.join(self.scenariodir, '{}'.format(alt)) for alt in fixtureAlts(n)]
+
+  def cases(self, n):
+    """Creates the case directories with tape5 and tape7, returns the datadirs
+    """
+    datadirs = self.datadirs(n)
+    for datadir in datadirs[self.ncases:]:
+      if not os.path.exists(datadir):
+        os.makedirs(datadir)
+      shutil.copyfile(os.path.join(self.scenariodir, 'tape5'), os.path.join(datadir, 'tape5'))
+      if datadir == datadirs[0]:
+        stubmodtran.runStub(datadir)
+      else:
+        for name in ['tape6', 'tape7']:
+          linkFile(os.path.join(datadirs[0], name), os.path.join(datadir, name))
+    self.ncases = max(self.ncases, n)
+    return datadirs
+
+  def spectra(self):
+    """Returns the stub tape7 data array of the fixture, all columns
+    """
+    return stubmodtran.stubSpectra(*stubmodtran.readGeometry(self.lines))
+
+###############################################################
+#Each stage takes the fixture and the size, prepares its inputs and returns
+#the function to be timed.
+
+def stageTape5(fixture, n):
+  spec = {'kind':'1km'}
+  cases = [sweep.Case(i, scenario, alt, None, None) for i, alt in enumerate(fixtureAlts(n))]
+  def run():
+    for case in cases:
+      sweep.writeCase(spec, case)
+  return run
+
+def stageLaunch(fixture, n):
+  import stdatmos.scheduler as scheduler
+  datadirs = fixture.cases(n)
+  def run():
+    scheduler.runJobs(datadirs, stubmodtran.stubCommand())
+  return run
+
+def stageCopy(fixture, n):
+  import stdatmos.cache as cache
+  datadirs = fixture.cases(n)
+  cachedir = os.path.join(fixture.workdir, 'cache')
+  if os.path.exists(cachedir):
+    shutil.rmtree(cachedir)
+  resultcache = cache.ResultCache(cachedir)
+  keys = ['{:064x}'.format(i) for i in range(n)]
+  def run():
+    for key, datadir in zip(keys, datadirs):
+      resultcache.store(key, datadir)
+    for key, datadir in zip(keys, datadirs):
+      resultcache.fetch(key, datadir)
+  return run
+
+def stageLoadTape7(fixture, n):
+  importlib.import_module('pyradi.rymodtran')
+  import stdatmos.tape7store as tape7store
+  datadirs = fixture.cases(n)
+  def run():
+    for datadir in datadirs:
+      tape7store.loadTape7(datadir, ['FREQ', 'DEPTH'])
+  return run
+
+def stageIntegrate(fixture, n):
+  import stdatmos.pipeline as pipeline
+  specranges = readSpecRanges()
+  spectra = fixture.spectra()
+  data = spectra[:, [stubmodtran.tape7Columns.index(col) for col in pipeline.integrateColumns]]
+  meta = {'scenario':scenario, 'altitude':0., 'elevation':0.}
+  def run():
+    cases = (('{}'.format(i), dict(meta, elevation=float(i)), data) for i in range(n))
+    for row in pipeline.integrateCases(cases, specranges):
+      pass
+  return run
+
+def stageTau1km(fixture, n):
+  import stdatmos.tau1km as tau1km
+  spectra = fixture.spectra()
+  freq = spectra[:, stubmodtran.tape7Columns.index('FREQ')]
+  depth = np.tile(spectra[:, stubmodtran.tape7Columns.index('DEPTH')], (n, 1))
+  def run():
+    tau1km.tau1kmBatch(freq, depth, fixtureAlts(n), 45.0 * np.pi / 180., 1500)
+  return run
+
+def prepareTau1km(fixture, n):
+  """Writes the 1 km transmittance store of the fixture scenario
+  """
+  import stdatmos.tape7store as tape7store
+  import stdatmos.tau1km as tau1km
+  spectra = fixture.spectra()
+  depth = np.tile(spectra[:, stubmodtran.tape7Columns.index('DEPTH')], (n, 1))
+  wl, tau = tau1km.tau1kmBatch(spectra[:, 0], depth, fixtureAlts(n), 45.0 * np.pi / 180., 1500)
+  tape7store.writeStore(tau1km.scenarioStore(scenario), {'WAVELENGTH':wl, 'TAU1KM':tau},
+    meta={'scenario':scenario, 'altitudes':fixtureAlts(n)})
+
+def stagePlot(fixture, n):
+  importlib.import_module('matplotlib')
+  import stdatmos.plotting as plotting
+  prepareTau1km(fixture, n)
+  def run():
+    plotting.plotTau(fixtureAlts(n), [scenario])
+  return run
+
+def stageWriteXLS(fixture, n):
+  importlib.import_module('xlsxwriter')
+  import stdatmos.export as export
+  prepareTau1km(fixture, n)
+  def run():
+    export.writeTau1km(fixtureAlts(n), [scenario])
+  return run
+
+def stageExportXLS(fixture, n):
+  importlib.import_module('xlsxwriter')
+  import stdatmos.integrate as integrate
+  import stdatmos.resultstore as resultstore
+  dbfile = os.path.join(fixture.workdir, 'bench.db')
+  if os.path.exists(dbfile):
+    os.remove(dbfile)
+  store = resultstore.ResultStore(dbfile, integrate.resultColumns)
+  store.writeSpecRanges(readSpecRanges())
+  values = np.random.RandomState(0).uniform(size=len(integrate.resultColumns))
+  store.appendRows([[scenario, 0., float(i), key] + list(values)
+    for i in range(n) for key in readSpecRanges()])
+  def run():
+    store.exportExcel(os.path.join(fixture.workdir, 'bench.xlsx'))
+  return run
+
+stageFunctions = {'tape5':stageTape5, 'launch':stageLaunch, 'copy':stageCopy,
+  'loadtape7':stageLoadTape7, 'integrate':stageIntegrate, 'tau1km':stageTau1km,
+  'plot':stagePlot, 'writexls':stageWriteXLS, 'exportxls':stageExportXLS}
+
+###############################################################
+def gitCommit():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=repoDir,
+      stderr=subprocess.DEVNULL).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+###############################################################
+def runBenchmarks(stages=None, sizes=None, repeat=1, workdir=None, nolimit=False):
+  """Times the stages at the sizes, returns the results as a dict.
+  Each result has the stage, size and the times of the repeats in seconds,
+  or the reason the stage was skipped.
+  """
+  if stages is None:
+    stages = stageNames
+  if sizes is None:
+    sizes = [1, 10, 100, 1000]
+  keepdir = workdir is not None
+  if workdir is None:
+    workdir = tempfile.mkdtemp(prefix='benchsweep')
+  cwd = os.getcwd()
+  results = []
+  try:
+    os.chdir(workdir)
+    fixture = Fixture(os.path.abspath(workdir))
+    for stage in stages:
+      for n in sizes:
+        result = {'stage':stage, 'size':n}
+        if not nolimit and n > stageLimits.get(stage, n):
+          result['skipped'] = 'size above the stage limit {}'.format(stageLimits[stage])
+        else:
+          times = []
+          try:
+            for i in range(repeat):
+              run = stageFunctions[stage](fixture, n)
+              start = time.perf_counter()
+              run()
+              times.append(time.perf_counter() - start)
+          except ImportError as err:
+            result['skipped'] = 'missing dependency: {}'.format(err)
+          else:
+            result['seconds'] = times
+            result['best'] = min(times)
+            result['percase'] = min(times) / n
+        results.append(result)
+        print(formatResult(result))
+        sys.stdout.flush()
+  finally:
+    os.chdir(cwd)
+    if not keepdir:
+      shutil.rmtree(workdir, ignore_errors=True)
+
+  return {'commit':gitCommit(), 'timestamp':time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'python':platform.python_version(), 'numpy':np.__version__,
+    'platform':platform.platform(), 'cpus':os.cpu_count(),
+    'grid':list(fixtureGrid), 'repeat':repeat, 'results':results}
+
+###############################################################
+def formatResult(result):
+  if 'skipped' in result:
+    return '{:10s} {:6d}  skipped, {}'.format(result['stage'], result['size'], result['skipped'])
+  return '{:10s} {:6d} {:10.3f} s {:10.2f} ms/case'.format(result['stage'], result['size'],
+    result['best'], 1e3 * result['percase'])
+
+###############################################################
+def compareResults(oldfile, newfile):
+  """Prints the best times of two benchmark runs and their ratio
+  """
+  with open(oldfile, 'rt') as fin:
+    old = json.load(fin)
+  with open(newfile, 'rt') as fin:
+    new = json.load(fin)
+  oldbest = dict([((r['stage'], r['size']), r['best']) for r in old['results'] if 'best' in r])
+  print('{:10s} {:>6s} {:>10s} {:>10s} {:>7s}'.format('stage', 'size', 'old s', 'new s', 'new/old'))
+  for r in new['results']:
+    key = (r['stage'], r['size'])
+    if 'best' in r and key in oldbest:
+      print('{:10s} {:6d} {:10.3f} {:10.3f} {:7.2f}'.format(r['stage'], r['size'], oldbest[key],
+        r['best'], r['best'] / oldbest[key]))
+
+##########################################################################################################
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Benchmarks of the sweep stages')
+  parser.add_argument('--stages', nargs='+', choices=stageNames, default=stageNames)
+  parser.add_argument('--sizes', nargs='+', type=int, default=[1, 10, 100, 1000])
+  parser.add_argument('--repeat', type=int, default=1)
+  parser.add_argument('--workdir', default=None, help='fixture directory, kept after the run')
+  parser.add_argument('--nolimit', action='store_true', help='ignore the stage size limits')
+  parser.add_argument('--output', default='benchsweep.json')
+  parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+  args = parser.parse_args()
+
+  if args.compare:
+    compareResults(*args.compare)
+  else:
+    report = runBenchmarks(args.stages, args.sizes, args.repeat, args.workdir, args.nolimit)
+    with open(args.output, 'wt') as fout:
+      json.dump(report, fout, indent=1)
+    print('results written to {}'.format(args.output))
@@ -0,0 +1,9 @@
+"""Reusable helpers for the domodtran*.py sweep scripts.
+
+The scripts in the root directory create tape5 files from the scenario
+templates, run modtran on them and post-process the tape7 files.
+The functions in this package are shared between the scripts.
+Import the modules directly, e.g.
+
+  import stdatmos.scheduler as scheduler
+"""
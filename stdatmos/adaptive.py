@@ -0,0 +1,180 @@
+"""Adaptive zenith sampling of the elevation sweep.
+
+The wideband results of the elevation sweep change slowly with the
+zenith angle over most of the dense zenith grid of sweeps/elevation.json,
+and quickly only near the horizon (80-100 deg).  Here modtran is run on
+a coarse subset of the grid first, every step-th zenith angle, and the
+grid is refined only where an interpolating surrogate of the results is
+not accurate enough:
+
+ - the surrogate of each (atmosphere, altitude, spectral band) is the
+   PCHIP (shape preserving cubic) interpolant of surrogateQuantities
+   (effTauSun, effTau300 and LpathWatt) over the zenith angles run,
+ - the error of the surrogate between two neighbouring zenith angles
+   run is estimated at the grid angle halfway between them, as the
+   difference between the PCHIP and a cubic spline interpolant, which
+   agree where the quantity is smooth and differ near kinks and steep
+   changes,
+ - the error is relative to the largest magnitude of the quantity over
+   the zenith angles (the largest transmittance or path radiance), and
+   modtran is run on the halfway angle if the error of any quantity in
+   any band is larger than the tolerance.
+
+The refinement is repeated, one round of modtran runs at a time, until
+the error is below the tolerance everywhere.  Each round runs all the
+atmospheres and altitudes at once, in parallel.  The zenith angles that
+were not run are then interpolated with the surrogate (all the result
+columns) into a second table of the result store:
+
+  store = resultstore.ResultStore('atmos-elevation-angles.db', columns)
+  ncases, nrows = adaptive.adaptiveSweep(spec, store, runRound, tol=1e-3)
+  fillstore = resultstore.ResultStore('atmos-elevation-angles.db', columns, 'surrogate')
+  adaptive.fillSurrogate(spec, store, fillstore)
+  store.exportExcel('atmos-elevation-angles.xlsx', fill='surrogate')
+
+runRound(roundspec) runs modtran on the cases of roundspec (the sweep
+spec with an explicit case list) and appends the results to the store,
+see domodtran-elevation.py.  Results already in the store, e.g. of an
+earlier full or adaptive sweep, are used and not run again.
+
+A feature narrower than the spacing of the coarse grid, between two
+angles where the two interpolants agree, is not detected.  Use a smaller
+step for quantities with such features.
+"""
+
+import numpy as np
+
+#the quantities that decide where the grid is refined, see integrate.resultColumnsFor
+surrogateQuantities = ['effTauSun', 'effTau300', 'LpathWatt']
+
+###############################################################
+def initialIndices(ngrid, step):
+  """Returns the indices of the coarse grid, every step-th index of the
+  grid and the last, at least three indices
+  """
+  indices = set(range(0, ngrid, step))
+  indices.add(ngrid - 1)
+  if len(indices) < 3 and ngrid >= 3:
+    indices.add(ngrid // 2)
+  return sorted(indices)
+
+###############################################################
+def interpolants(zeniths, values, znew):
+  """Returns the PCHIP and cubic spline interpolants (len(znew), nseries)
+  at znew of values (len(zeniths), nseries), zeniths ascending
+  """
+  from scipy.interpolate import CubicSpline, PchipInterpolator
+  pchip = PchipInterpolator(zeniths, values, axis=0)(znew)
+  return pchip, CubicSpline(zeniths, values, axis=0)(znew)
+
+###############################################################
+def groupSamples(store, atmo, altitude, grid, bands, quantities):
+  """Returns the grid indices of the zenith angles stored for atmo and
+  altitude in all the bands, and the stored values (nsampled, nbands,
+  nquantities) in the order of bands and quantities
+  """
+  rows = store.readGroup(atmo, altitude)
+  columns = store.allColumns()
+  qcols = [columns.index(quantity) for quantity in quantities]
+  gridindex = dict([(round(zenith, 2), i) for i, zenith in enumerate(grid)])
+  samples = {}
+  for row in rows:
+    i = gridindex.get(round(row[2], 2))
+    if i is not None and row[3] in bands:
+      samples.setdefault(i, {})[row[3]] = [row[col] for col in qcols]
+  indices = sorted([i for i in samples if len(samples[i]) == len(bands)])
+  values = np.array([[samples[i][band] for band in bands] for i in indices], dtype=np.float64)
+  return indices, values.reshape(len(indices), len(bands), len(quantities))
+
+###############################################################
+def refineIndices(grid, indices, values, tol, tried=()):
+  """Returns the grid indices to run next: between each two neighbouring
+  sampled indices, the untried index nearest halfway between them, where
+  the estimated error of the surrogate (relative to the largest magnitude
+  of each series) exceeds tol.  values (len(indices), ...) are the sampled
+  values.
+  """
+  candidates = []
+  for i0, i1 in zip(indices[:-1], indices[1:]):
+    gap = [i for i in range(i0 + 1, i1) if i not in tried]
+    if gap:
+      candidates.append(min(gap, key=lambda i: abs(2 * i - i0 - i1)))
+  if not candidates or len(indices) < 3:
+    return []
+  grid = np.asarray(grid, dtype=np.float64)
+  values = values.reshape(len(indices), -1)
+  pchip, spline = interpolants(grid[indices], values, grid[candidates])
+  scale = np.nanmax(np.abs(values), axis=0)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    error = np.abs(pchip - spline) / np.where(scale > 0, scale, np.inf)
+  return [i for i, err in zip(candidates, np.nanmax(error, axis=1)) if err > tol]
+
+###############################################################
+def sweepGroups(spec, shard=0, nshards=1):
+  """Returns the (atmosphere, altitude) of shard (0 to nshards-1), dealt
+  round robin to the shards
+  """
+  if spec['kind'] != 'elev' or spec['bands'] or 'cases' in spec:
+    raise ValueError('adaptive sampling needs an elev sweep without bands or case list')
+  groups = [(atmo, alt) for atmo in spec['atmospheres'] for alt in spec['altitudes']]
+  return groups[shard::nshards]
+
+###############################################################
+def adaptiveSweep(spec, store, runRound, tol=1e-3, step=8, quantities=None, shard=0,
+                  nshards=1, maxrounds=20):
+  """Runs the elevation sweep spec (shard of nshards) on the coarse grid
+  (every step-th zenith angle) and refines the grid where the surrogate
+  error exceeds tol, see the module docstring.  runRound(roundspec) runs
+  and stores the cases in roundspec, and returns the number of rows
+  stored.  Returns the number of cases run and of rows stored.
+  """
+  if quantities is None:
+    quantities = surrogateQuantities
+  grid = spec['geometries']
+  bands = sorted(store.readSpecRanges().keys())
+  groups = sweepGroups(spec, shard, nshards)
+  pending = dict([(group, initialIndices(len(grid), step)) for group in groups])
+  tried = dict([(group, set(pending[group])) for group in groups])
+  ncases, nrows = 0, 0
+  for iround in range(maxrounds):
+    cases = []
+    for atmo, alt in groups:
+      stored = store.existingKeys(atmo, alt)
+      cases.extend([[atmo, alt, grid[i]] for i in pending[(atmo, alt)]
+        if not all([(round(grid[i], 2), band) in stored for band in bands])])
+    if cases:
+      nrows += runRound(dict(spec, cases=cases))
+      ncases += len(cases)
+    for atmo, alt in groups:
+      indices, values = groupSamples(store, atmo, alt, grid, bands, quantities)
+      pending[(atmo, alt)] = refineIndices(grid, indices, values, tol, tried[(atmo, alt)])
+      tried[(atmo, alt)].update(pending[(atmo, alt)])
+    if not any(pending.values()):
+      break
+  return ncases, nrows
+
+###############################################################
+def fillSurrogate(spec, store, fillstore, shard=0, nshards=1):
+  """Interpolates the results in store to the zenith angles of the grid
+  that are not stored, with the PCHIP surrogate of each of the columns of
+  fillstore (a second table of the store), and replaces the rows of
+  fillstore for each atmosphere and altitude of the shard.  Returns the
+  number of rows written.
+  """
+  grid = spec['geometries']
+  bands = sorted(store.readSpecRanges().keys())
+  quantities = fillstore.columns
+  nrows = 0
+  for atmo, alt in sweepGroups(spec, shard, nshards):
+    fillstore.deleteGroup(atmo, alt)
+    indices, values = groupSamples(store, atmo, alt, grid, bands, quantities)
+    missing = [i for i in range(len(grid)) if i not in set(indices)]
+    if len(indices) < 2 or not missing:
+      continue
+    zgrid = np.asarray(grid, dtype=np.float64)
+    pchip, spline = interpolants(zgrid[indices], values.reshape(len(indices), -1), zgrid[missing])
+    pchip = pchip.reshape(len(missing), len(bands), len(quantities))
+    rows = [[atmo, alt, round(grid[i], 2), band] + pchip[j, k].tolist()
+      for j, i in enumerate(missing) for k, band in enumerate(bands)]
+    nrows += fillstore.appendRows(rows)
+  return nrows
@@ -0,0 +1,172 @@
+"""Content-addressed store of modtran results.
+
+The key of a case is the sha256 hash of the final tape5 text plus the
+identity of the modtran executable (filename, size and modification time).
+A case with the same key has the same tape6/tape7, so it need not be run
+again: the stored tape6/tape7 are copied to the case directory instead.
+
+cache dir structure:
+|dir cachedir
+  | dir key[:2]
+    | dir key
+      |file tape6
+      |file tape7
+
+The cache has a size cap.  When a new entry takes the total size over the
+cap, the least recently used entries are removed.  An entry is 'used' when
+it is stored or fetched, its directory modification time is the use time.
+The total size is kept per process: the cache is scanned on the first
+store and the total is updated as entries are stored and evicted.  The
+entries stored by other processes are counted at the next scan, which is
+done when the total goes over the cap, or after rescanFraction of the cap
+has been stored by this process.  An eviction removes entries down to
+(1 - rescanFraction) of the cap, so that a full cache is not scanned on
+every store.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+cachedFiles = ['tape6', 'tape7']
+
+#the fraction of the cap stored by this process between scans of the cache,
+#and freed by an eviction
+rescanFraction = 0.1
+
+#[total size, bytes stored since the last scan] of each cache dir, in this process
+cacheTotals = {}
+
+###############################################################
+def exeIdentity(modtranexe):
+  """Returns a string that identifies the modtran executable.
+  modtranexe is a filename or a command list, files in the list are
+  identified by name, size and modification time.
+  """
+  if not isinstance(modtranexe, (list, tuple)):
+    modtranexe = [modtranexe]
+  ident = []
+  for item in modtranexe:
+    ident.append(os.path.abspath(item) if os.path.isfile(item) else item)
+    if os.path.isfile(item):
+      stat = os.stat(item)
+      ident.append('{} {}'.format(stat.st_size, int(stat.st_mtime)))
+  return '\n'.join(ident)
+
+###############################################################
+def caseKey(tape5file, modtranexe):
+  """Returns the cache key for a tape5 file run with modtranexe
+  """
+  with open(tape5file, 'rb') as fin:
+    tape5 = fin.read()
+  h = hashlib.sha256()
+  h.update(tape5.replace(b'\r\n', b'\n'))
+  h.update(b'\0')
+  h.update(exeIdentity(modtranexe).encode('utf-8'))
+  return h.hexdigest()
+
+###############################################################
+class ResultCache(object):
+  """Stores and fetches tape6/tape7 files by case key.
+  cachedir is created if it does not exist, maxbytes is the size cap.
+  """
+
+  def __init__(self, cachedir, maxbytes=10e9):
+    self.cachedir = cachedir
+    self.maxbytes = maxbytes
+    if not os.path.exists(cachedir):
+      os.makedirs(cachedir)
+
+  def entryDir(self, key):
+    return os.path.join(self.cachedir, key[:2], key)
+
+  def fetch(self, key, datadir):
+    """Copies the stored tape6/tape7 to datadir.
+    Returns True if the key is in the cache, else False.
+    """
+    entrydir = self.entryDir(key)
+    if not os.path.exists(os.path.join(entrydir, 'tape7')):
+      return False
+    try:
+      for name in cachedFiles:
+        shutil.copy2(os.path.join(entrydir, name), datadir)
+      os.utime(entrydir)
+    except OSError:
+      #evicted by another process while copying
+      return False
+    return True
+
+  def store(self, key, datadir):
+    """Stores the tape6/tape7 in datadir under key, and evicts old entries.
+    """
+    entrydir = self.entryDir(key)
+    if os.path.exists(entrydir):
+      os.utime(entrydir)
+      return
+    parent = os.path.dirname(entrydir)
+    if not os.path.exists(parent):
+      os.makedirs(parent, exist_ok=True)
+    #copy to a temporary dir and rename, so that other processes never
+    #see a partly written entry
+    tmpdir = tempfile.mkdtemp(prefix='tmp-', dir=parent)
+    for name in cachedFiles:
+      shutil.copy2(os.path.join(datadir, name), tmpdir)
+    nbytes = sum([os.path.getsize(os.path.join(tmpdir, name)) for name in cachedFiles])
+    try:
+      os.rename(tmpdir, entrydir)
+    except OSError:
+      #stored by another process in the meantime
+      shutil.rmtree(tmpdir, ignore_errors=True)
+      return
+    self.addSize(nbytes)
+
+  def addSize(self, nbytes):
+    """Adds a new entry of nbytes to the running total, and evicts old
+    entries (after a scan of the cache) if the total is over the cap
+    """
+    key = os.path.abspath(self.cachedir)
+    if key not in cacheTotals:
+      self.evict()
+      return
+    total, added = cacheTotals[key]
+    cacheTotals[key] = [total + nbytes, added + nbytes]
+    if total + nbytes > self.maxbytes or added + nbytes > rescanFraction * self.maxbytes:
+      self.evict()
+
+  def entries(self):
+    """Returns a list of (use time, size in bytes, entry dir)
+    """
+    entries = []
+    for sub in os.scandir(self.cachedir):
+      if not sub.is_dir():
+        continue
+      for entry in os.scandir(sub.path):
+        if not entry.is_dir() or entry.name.startswith('tmp-'):
+          continue
+        size = 0
+        for f in os.scandir(entry.path):
+          size += f.stat().st_size
+        entries.append((entry.stat().st_mtime, size, entry.path))
+    return entries
+
+  def size(self):
+    """Returns the total size of the cache entries in bytes
+    """
+    return sum([size for mtime, size, path in self.entries()])
+
+  def evict(self):
+    """Scans the cache and, if it is over maxbytes, removes the least
+    recently used entries until it is under (1 - rescanFraction) maxbytes.
+    Returns the total size after eviction.
+    """
+    entries = sorted(self.entries())
+    total = sum([size for mtime, size, path in entries])
+    target = self.maxbytes if total <= self.maxbytes else (1. - rescanFraction) * self.maxbytes
+    for mtime, size, path in entries:
+      if total <= target:
+        break
+      shutil.rmtree(path, ignore_errors=True)
+      total -= size
+    cacheTotals[os.path.abspath(self.cachedir)] = [total, 0]
+    return total
@@ -0,0 +1,187 @@
+"""Spectral lookup cube of the tape7 spectra from a sweep.
+
+The tape7 spectra from the elevation sweep (<dir>/elev/<alt>/<elev>) or
+the horizontal sweep (<dir>/horizontal/<alt>/<range>) are assembled into
+one cube per sweep, with a chunk per atmosphere and tape7 column:
+
+  chunk[altitude, geometry, wavenumber]
+
+where the geometry is the zenith angle or the range.  The horizontal
+cube also has the ranges expanded from the reference run of each altitude
+(<dir>/horizontal/<alt>/ranges.store, see rangesweep.py), the geometries
+are the union of the ranges run and expanded, and a range that was run
+directly is taken from its tape7.  The chunks are
+float32 .npy files, half the size of the tape7 data, and are memory-mapped
+when queried: only the spectra around the query geometries are read from
+disk.  (zlib-style compression is not used, since compressed chunks
+cannot be memory-mapped.)
+
+cube dir structure:
+|dir cubedir
+  |file meta.json  (sweep, atmospheres, altitudes, geometries, columns)
+  |file FREQ.npy
+  |file <atmosphere>-<column>.npy
+  |...
+
+Queries interpolate linearly in altitude and geometry, for batches of
+geometries at once:
+
+  cube = SpectralCube('cube-elev')
+  tau = cube.query('TOT_TRANS', 'TropicalRural', alts, zeniths)   # (nqueries, nfreq)
+"""
+
+import json
+import os
+import numpy as np
+
+import stdatmos.lut as lut
+import stdatmos.rangesweep as rangesweep
+import stdatmos.tape7store as tape7store
+
+#tape7 columns in the cube
+cubeColumns = ['TOT_TRANS', 'DEPTH', 'TOTAL_RAD']
+
+###############################################################
+def sweepCases(dirs, sweep):
+  """Returns the sorted altitudes, geometries and a dict of cases keyed
+  by (dir, altitude, geometry), for the tape7 files in the sweep.  A case
+  is the case dir, or (range store dir, range index) for a range of the
+  horizontal sweep that is only in the range store.
+  """
+  cases = {}
+  for dir in dirs:
+    sweepdir = os.path.join(dir, sweep)
+    if not os.path.exists(sweepdir):
+      continue
+    for altname in os.listdir(sweepdir):
+      altdir = os.path.join(sweepdir, altname)
+      if not os.path.isdir(altdir):
+        continue
+      for geomname in os.listdir(altdir):
+        datadir = os.path.join(altdir, geomname)
+        if os.path.exists(os.path.join(datadir, 'tape7')):
+          cases[(dir, float(altname), float(geomname))] = datadir
+      storedir = os.path.join(altdir, rangesweep.rangeStoreName)
+      meta = tape7store.readMeta(storedir) if sweep == 'horizontal' else None
+      if meta is not None:
+        for i, storerange in enumerate(meta['ranges']):
+          cases.setdefault((dir, float(altname), round(float(storerange), 2)), (storedir, i))
+  alts = sorted(set([key[1] for key in cases]))
+  geoms = sorted(set([key[2] for key in cases]))
+  return alts, geoms, cases
+
+###############################################################
+def buildCube(cubedir, dirs, sweep='elev', columns=None):
+  """Assembles the tape7 spectra of the sweep ('elev' or 'horizontal') for
+  the atmospheres in dirs into a cube in cubedir.  All the tape7 files must
+  share the wavenumber grid.  Grid points without a tape7 are NaN.
+  """
+  if columns is None:
+    columns = cubeColumns
+  alts, geoms, cases = sweepCases(dirs, sweep)
+  if not os.path.exists(cubedir):
+    os.makedirs(cubedir)
+  atmos = sorted(set([key[0] for key in cases]))
+
+  freq = None
+  for atmo in atmos:
+    chunks = None
+    for (dir, alt, geom), case in cases.items():
+      if dir != atmo:
+        continue
+      data = caseData(case, ['FREQ'] + columns)
+      if freq is None:
+        freq = data[:,0].copy()
+        np.save(os.path.join(cubedir, 'FREQ.npy'), freq)
+      elif not np.array_equal(freq, data[:,0]):
+        raise ValueError('{} has a different wavenumber grid'.format(case))
+      if chunks is None:
+        chunks = []
+        for column in columns:
+          chunk = np.lib.format.open_memmap(os.path.join(cubedir, chunkFilename(atmo, column)),
+            mode='w+', dtype=np.float32, shape=(len(alts), len(geoms), freq.shape[0]))
+          chunk[:] = np.nan
+          chunks.append(chunk)
+      for i, chunk in enumerate(chunks):
+        chunk[alts.index(alt), geoms.index(geom), :] = data[:, i+1]
+    for chunk in chunks:
+      chunk.flush()
+    del chunks
+
+  meta = {'sweep':sweep, 'geometry':'zenith' if sweep == 'elev' else 'range',
+    'atmospheres':atmos, 'altitudes':alts, 'geometries':geoms, 'columns':columns}
+  with open(os.path.join(cubedir, 'meta.json'), 'wt') as fout:
+    json.dump(meta, fout, indent=1)
+
+###############################################################
+def caseData(case, colspec):
+  """Returns the columns in colspec of a case of sweepCases as a 2-D
+  array (nfreq, ncolumns)
+  """
+  if not isinstance(case, tuple):
+    return tape7store.loadTape7(case, colspec, tape7store.caseMeta(case))
+  storedir, i = case
+  missing = [column for column in colspec if column not in tape7store.readMeta(storedir)['columns']]
+  if missing:
+    raise ValueError('{} does not have the columns {}'.format(storedir, missing))
+  spectra = tape7store.readStore(storedir, colspec)
+  return np.array([spectra[column] if column == 'FREQ' else spectra[column][i]
+    for column in colspec], dtype=np.float64).T
+
+###############################################################
+def chunkFilename(atmo, column):
+  return '{}-{}'.format(atmo, tape7store.columnFilename(column))
+
+###############################################################
+class SpectralCube(object):
+  """Memory-mapped spectral cube, see buildCube
+  """
+
+  def __init__(self, cubedir):
+    self.cubedir = cubedir
+    with open(os.path.join(cubedir, 'meta.json'), 'rt') as fin:
+      self.meta = json.load(fin)
+    self.atmos = self.meta['atmospheres']
+    self.alts = np.array(self.meta['altitudes'], dtype=np.float64)
+    self.geoms = np.array(self.meta['geometries'], dtype=np.float64)
+    self.freq = np.load(os.path.join(cubedir, 'FREQ.npy'))
+    self.chunks = {}
+
+  def chunk(self, atmo, column):
+    """Returns the memory-mapped chunk[altitude, geometry, wavenumber]
+    """
+    if (atmo, column) not in self.chunks:
+      self.chunks[(atmo, column)] = np.load(os.path.join(self.cubedir,
+        chunkFilename(atmo, column)), mmap_mode='r')
+    return self.chunks[(atmo, column)]
+
+  def query(self, column, atmo, alt, geom):
+    """Returns the column spectra interpolated to the altitudes and
+    geometries (zenith angles or ranges), shape (nqueries, nfreq).
+    atmo is a name or an array of names, alt and geom are arrays,
+    all are broadcast against each other.  Outside the grid the values
+    are clamped to the grid edges, a NaN spectrum (missing grid point) only
+    gives NaN where it has a weight.
+    """
+    atmo, alt, geom = np.broadcast_arrays(np.asarray(atmo), alt, geom)
+    atmo, alt, geom = atmo.ravel(), alt.ravel(), geom.ravel()
+    ih, wh = lut.gridIndex(self.alts, alt)
+    ig, wg = lut.gridIndex(self.geoms, geom)
+    ih1 = np.minimum(ih + 1, self.alts.shape[0] - 1)
+    ig1 = np.minimum(ig + 1, self.geoms.shape[0] - 1)
+    wh = wh.reshape(-1, 1)
+    wg = wg.reshape(-1, 1)
+
+    spectra = np.zeros((alt.shape[0], self.freq.shape[0]))
+    for name in np.unique(atmo):
+      sel = atmo == name
+      chunk = self.chunk(str(name), column)
+      spectra[sel] = lut.bilinear(chunk[ih[sel], ig[sel]], chunk[ih[sel], ig1[sel]],
+        chunk[ih1[sel], ig[sel]], chunk[ih1[sel], ig1[sel]], wh[sel], wg[sel])
+    return spectra
+
+##########################################################################################################
+if __name__ == '__main__':
+  import ModelSummary
+  for sweep in ['elev', 'horizontal']:
+    buildCube('cube-{}'.format(sweep), list(ModelSummary.atmospheres.keys()), sweep)
@@ -0,0 +1,150 @@
+"""Streaming export of the sweep results to xlsx, csv or parquet.
+
+The exports are written row by row from the underlying arrays (the 1 km
+scenario stores, see tau1km.py) or from a database cursor (the elevation
+results, see resultstore.py), a block of rows at a time, so that memory
+does not grow with the size of the sweep:
+
+ - xlsx: xlsxwriter in constant_memory mode, each row is written to disk
+   as soon as the next row is started.  The rows must therefore be
+   written in order, the header rows first.
+ - csv: the csv module, the rows of the xlsx sheet without the empty
+   first row and column.
+ - parquet: pyarrow (optional), one row group per block, one column per
+   altitude.
+
+The 1 km transmittance sheet of a scenario (<dir>/<dir>.xlsx, sheet tau)
+has the layout of the domodtran.py spreadsheets:
+
+     B             C        D        ...
+  2                Altitude
+  3  Wavelength    1000     3280     ...  ft
+  4  um            305      1000     ...  m
+  5  0.25          0.12     0.15     ...
+"""
+
+import csv
+import os
+import numpy as np
+
+import stdatmos.tau1km as tau1km
+
+#rows per block read from the arrays
+blockRows = 4096
+
+###############################################################
+def altitudeFeet(alt):
+  """Returns the altitude in m as ft, rounded to 10 ft, as in the spreadsheets
+  """
+  return 10 * int(round(alt * 0.328083))
+
+###############################################################
+def tauBlocks(wl, tau, rows, nrows=blockRows):
+  """Yields blocks of rows (nrows, 1 + len(rows)) with the wavelength in the
+  first column and the transmittance tau[rows[j]] in column j+1.  The
+  block is preallocated once and reused, copy it to keep it.
+  """
+  block = np.empty((min(nrows, wl.shape[0]), 1 + len(rows)))
+  for start in range(0, wl.shape[0], nrows):
+    stop = min(start + nrows, wl.shape[0])
+    out = block[:stop-start]
+    out[:, 0] = wl[start:stop]
+    for j, row in enumerate(rows):
+      out[:, j+1] = tau[row, start:stop]
+    yield out
+
+###############################################################
+def tauHeader(alts):
+  """Returns the header rows of the 1 km transmittance sheet, from column B
+  """
+  return [[None, 'Altitude'],
+    ['Wavelength'] + [altitudeFeet(alt) for alt in alts] + ['ft'],
+    [u'µm'] + list(alts) + ['m']]
+
+###############################################################
+def writeTauXLSX(filename, alts, wl, tau, rows, sheetname='tau'):
+  """Writes the 1 km transmittance tau[rows] (one row per altitude in alts)
+  to the sheet of a new workbook, in constant memory
+  """
+  import xlsxwriter
+  workbook = xlsxwriter.Workbook(filename, {'constant_memory':True, 'nan_inf_to_errors':True})
+  try:
+    worksheet = workbook.add_worksheet(sheetname)
+    for i, header in enumerate(tauHeader(alts)):
+      worksheet.write_row(i + 1, 1, header)
+    irow = 4
+    for block in tauBlocks(wl, tau, rows):
+      for values in block.tolist():
+        worksheet.write_row(irow, 1, values)
+        irow += 1
+  finally:
+    workbook.close()
+
+###############################################################
+def writeTauCSV(filename, alts, wl, tau, rows):
+  """Writes the 1 km transmittance as writeTauXLSX, to a csv file
+  """
+  with open(filename, 'wt', newline='') as fout:
+    writer = csv.writer(fout)
+    for header in tauHeader(alts):
+      writer.writerow(['' if value is None else value for value in header])
+    for block in tauBlocks(wl, tau, rows):
+      writer.writerows(block.tolist())
+
+###############################################################
+def writeTauParquet(filename, alts, wl, tau, rows):
+  """Writes the 1 km transmittance to a parquet file, with the columns
+  wavelength and '<alt> m' for each altitude
+  """
+  import pyarrow as pa
+  import pyarrow.parquet as pq
+  names = ['wavelength'] + ['{} m'.format(alt) for alt in alts]
+  schema = pa.schema([(name, pa.float64()) for name in names])
+  with pq.ParquetWriter(filename, schema) as writer:
+    for block in tauBlocks(wl, tau, rows):
+      writer.write_table(pa.Table.from_arrays([pa.array(block[:, j]) for j in range(len(names))],
+        schema=schema))
+
+tauWriters = {'xlsx':writeTauXLSX, 'csv':writeTauCSV, 'parquet':writeTauParquet}
+
+###############################################################
+def writeTau1km(alts, dirs, fmt='xlsx'):
+  """Writes the 1 km transmittance of the altitudes of each scenario to
+  <dir>/<dir>.<fmt> (xlsx, csv or parquet), reading the scenario store
+  once, a block of rows at a time.  Altitudes not in a scenario store
+  (e.g. failed runs) are left out.  Returns the filenames.
+  """
+  filenames = []
+  for directory in dirs:
+    salts, wl, tau = tau1km.readScenario(directory)
+    dalts = [alt for alt in alts if alt in salts]
+    filename = os.path.join(directory, '{}.{}'.format(directory, fmt))
+    tauWriters[fmt](filename, dalts, wl, tau, [salts.index(alt) for alt in dalts])
+    filenames.append(filename)
+  return filenames
+
+###############################################################
+def writeRowsXLSX(filename, sheets):
+  """Writes a workbook in constant memory, sheets is a list of
+  (sheet name, header row, iterable of rows), the rows are read as written
+  """
+  import xlsxwriter
+  workbook = xlsxwriter.Workbook(filename, {'constant_memory':True, 'nan_inf_to_errors':True})
+  try:
+    bold = workbook.add_format({'bold':True})
+    for name, header, rows in sheets:
+      worksheet = workbook.add_worksheet(name)
+      worksheet.write_row(0, 0, header, bold)
+      for irow, row in enumerate(rows):
+        worksheet.write_row(irow + 1, 0, row)
+  finally:
+    workbook.close()
+
+###############################################################
+def writeRowsCSV(filename, header, rows):
+  """Writes the header and the rows to a csv file, the rows are read as written
+  """
+  with open(filename, 'wt', newline='') as fout:
+    writer = csv.writer(fout)
+    writer.writerow(header)
+    writer.writerows(rows)
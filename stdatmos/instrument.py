@@ -0,0 +1,228 @@
+"""Per-stage timing and resource use of a sweep.
+
+The stages of a sweep (tape5 generation, the modtran run, tape7 load,
+integration, export) are timed per case and written to a log file, one
+JSON record per line:
+
+  {"stage": "modtran", "case": "./TropicalRural/elev/0/45.00", "start": ...,
+   "wall": 12.3, "cpu": 11.9, "maxrss": 52428800, "readbytes": ..., "writebytes": ...}
+
+ - wall: wall time in seconds,
+ - cpu: user + system time in seconds, of the process and its finished
+   child processes (modtran itself for the modtran stage),
+ - maxrss: peak resident set size in bytes, of the process or of its
+   largest child so far (a high-water mark, not per stage),
+ - readbytes, writebytes: bytes read and written by the python process
+   (the copies, tape7 reads and exports, not the file access by modtran).
+
+maxrss and the I/O bytes need the resource module and /proc (Linux) or
+psutil, they are null where not available.
+
+The modtran stage is measured in the scheduler worker process, the
+other stages in the sweep script:
+
+  stagelog = instrument.StageLog('sweep-stages.jsonl')
+  with instrument.stage(stagelog, 'tape5') as record:
+    record['case'] = sweep.writeCase(spec, case)
+  stagelog.close()
+
+The summary report gives the throughput in cases per hour, the time per
+stage and the slowest cases:
+
+  python -m stdatmos.instrument sweep-stages.jsonl
+"""
+
+import contextlib
+import json
+import os
+import sys
+import time
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+try:
+  import psutil
+except ImportError:
+  psutil = None
+
+###############################################################
+def readIO():
+  """Returns the bytes read and written by this process, or (None, None)
+  """
+  if os.path.exists('/proc/self/io'):
+    counters = {}
+    with open('/proc/self/io', 'rt') as fin:
+      for line in fin:
+        name, value = line.split(':')
+        counters[name] = int(value)
+    return counters['rchar'], counters['wchar']
+  if psutil is not None:
+    try:
+      counters = psutil.Process().io_counters()
+      return counters.read_bytes, counters.write_bytes
+    except (AttributeError, psutil.Error):
+      pass
+  return None, None
+
+###############################################################
+def readMaxRSS():
+  """Returns the peak resident set size in bytes of this process or its
+  largest finished child, or None
+  """
+  if resource is not None:
+    maxrss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    #kilobytes on Linux, bytes on macOS
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+  if psutil is not None:
+    meminfo = psutil.Process().memory_info()
+    return getattr(meminfo, 'peak_wset', meminfo.rss)
+  return None
+
+###############################################################
+def resourceUsage():
+  """Returns the current resource counters, see usageDelta
+  """
+  times = os.times()
+  readbytes, writebytes = readIO()
+  return {'time':time.time(), 'wall':time.perf_counter(), 'cpu':times[0] + times[1] + times[2] + times[3],
+    'maxrss':readMaxRSS(), 'readbytes':readbytes, 'writebytes':writebytes}
+
+###############################################################
+def usageDelta(before, after):
+  """Returns the resources used between two resourceUsage() calls
+  """
+  usage = {'start':before['time'], 'wall':after['wall'] - before['wall'],
+    'cpu':after['cpu'] - before['cpu'], 'maxrss':after['maxrss'], 'pid':os.getpid()}
+  for name in ['readbytes', 'writebytes']:
+    usage[name] = None if before[name] is None else after[name] - before[name]
+  return usage
+
+###############################################################
+class StageLog(object):
+  """Writes stage records to logfile, one JSON object per line.
+  An existing logfile is replaced, unless append is True.
+  """
+
+  def __init__(self, logfile, append=False):
+    self.logfile = logfile
+    self.fout = open(logfile, 'at' if append else 'wt')
+
+  def close(self):
+    self.fout.close()
+
+  def write(self, name, case, usage, **fields):
+    record = {'stage':name, 'case':case}
+    record.update(usage)
+    record.update(fields)
+    self.fout.write(json.dumps(record) + '\n')
+    self.fout.flush()
+
+  def writeBatch(self, name, cases, usage):
+    """Writes a record per case, sharing the usage of the batch evenly
+    """
+    share = dict(usage)
+    for key in ['wall', 'cpu', 'readbytes', 'writebytes']:
+      if share[key] is not None:
+        share[key] = share[key] / len(cases)
+    for case in cases:
+      self.write(name, case, share, batch=len(cases))
+
+  def writeResult(self, result):
+    """Writes the modtran stage of a runner.RunResult, measured in the worker
+    """
+    usage = result.usage
+    if usage is None:
+      usage = {'start':time.time() - result.walltime, 'wall':result.walltime}
+    self.write('modtran', result.datadir, usage, returncode=result.returncode,
+      timedout=result.timedout, cached=result.cached, modtranwall=result.walltime)
+
+###############################################################
+@contextlib.contextmanager
+def stage(stagelog, name, case=None, **fields):
+  """Context that writes the resources used by its block to stagelog,
+  as stage name for case.  Does nothing if stagelog is None.
+  The context value is a dict of fields the block can add to the record,
+  including the case if it is only known in the block.
+  """
+  record = {}
+  if stagelog is None:
+    yield record
+    return
+  before = resourceUsage()
+  yield record
+  fields.update(record)
+  case = fields.pop('case', case)
+  stagelog.write(name, case, usageDelta(before, resourceUsage()), **fields)
+
+###############################################################
+def readLog(logfile):
+  """Returns the records in logfile as a list of dicts
+  """
+  with open(logfile, 'rt') as fin:
+    return [json.loads(line) for line in fin if line.strip()]
+
+###############################################################
+def summarise(records, nslowest=10):
+  """Returns the throughput, per stage totals and slowest cases of the records
+  """
+  span = 0.
+  if records:
+    span = max([r['start'] + r['wall'] for r in records]) - min([r['start'] for r in records])
+  runs = [r for r in records if r['stage'] == 'modtran']
+  ncases = len(set([r['case'] for r in runs if r.get('returncode') == 0]))
+  if not runs:
+    ncases = len(set([r['case'] for r in records if r['case'] is not None]))
+
+  stages = {}
+  for r in records:
+    s = stages.setdefault(r['stage'], {'count':0, 'wall':0., 'maxwall':0., 'cpu':0.,
+      'maxrss':0, 'readbytes':0, 'writebytes':0})
+    s['count'] += 1
+    s['wall'] += r['wall']
+    s['maxwall'] = max(s['maxwall'], r['wall'])
+    s['cpu'] += r.get('cpu') or 0.
+    s['maxrss'] = max(s['maxrss'], r.get('maxrss') or 0)
+    s['readbytes'] += r.get('readbytes') or 0
+    s['writebytes'] += r.get('writebytes') or 0
+
+  caseWall = {}
+  for r in records:
+    if r['case'] is not None:
+      caseWall[r['case']] = caseWall.get(r['case'], 0.) + r['wall']
+  slowest = sorted(caseWall.items(), key=lambda item: item[1], reverse=True)[:nslowest]
+
+  return {'span':span, 'cases':ncases, 'casesperhour':3600. * ncases / span if span > 0 else None,
+    'failed':len([r for r in runs if r.get('returncode') != 0]),
+    'cached':len([r for r in runs if r.get('cached')]), 'stages':stages, 'slowest':slowest}
+
+###############################################################
+def printSummary(summary):
+  print('{} cases in {:.1f} s'.format(summary['cases'], summary['span']), end='')
+  if summary['casesperhour'] is not None:
+    print(', {:.0f} cases/hour'.format(summary['casesperhour']), end='')
+  print(', {} cached, {} failed'.format(summary['cached'], summary['failed']))
+  print()
+  print('{:12s} {:>7s} {:>10s} {:>6s} {:>9s} {:>10s} {:>10s} {:>9s} {:>9s}'.format('stage', 'count',
+    'wall s', '%', 'max s', 'cpu s', 'rss MB', 'read MB', 'write MB'))
+  totalwall = sum([s['wall'] for s in summary['stages'].values()])
+  for name, s in sorted(summary['stages'].items(), key=lambda item: item[1]['wall'], reverse=True):
+    print('{:12s} {:7d} {:10.1f} {:6.1f} {:9.2f} {:10.1f} {:10.1f} {:9.1f} {:9.1f}'.format(name,
+      s['count'], s['wall'], 100. * s['wall'] / totalwall if totalwall > 0 else 0., s['maxwall'],
+      s['cpu'], s['maxrss'] / 1e6, s['readbytes'] / 1e6, s['writebytes'] / 1e6))
+  print()
+  print('slowest cases (wall time over all stages):')
+  for case, wall in summary['slowest']:
+    print('{:10.2f} s  {}'.format(wall, case))
+
+##########################################################################################################
+if __name__ == '__main__':
+  import argparse
+  parser = argparse.ArgumentParser(description='Summary of a sweep stage log')
+  parser.add_argument('logfile')
+  parser.add_argument('--slowest', type=int, default=10, help='number of slowest cases')
+  args = parser.parse_args()
+  printSummary(summarise(readLog(args.logfile), args.slowest))
@@ -0,0 +1,135 @@
+"""Band integrals of a stack of tape7 spectra, for all bands at once.
+
+The spectra are a 2-D array (files x wavenumbers) on a common wavenumber
+grid.  The trapezoid areas between neighbouring samples are calculated
+once for each quantity.  A band integral is the sum of the areas between
+the band edges, all bands are summed in one np.add.reduceat call.
+Differencing cumulative sums at the band edges would be shorter, but
+loses all precision where the integrand in the band is small relative
+to the full spectrum (e.g. 300 K Planck radiance in the visible).
+
+The band edges are found with searchsorted, the band selection is the
+same as
+  freq >= 1e4/specranges[key][1] and freq <= 1e4/specranges[key][0]
+so the results are the trapezoid integrals over the samples in the band,
+as in np.trapz(y[select], freq[select]).
+
+The quantities are those in the atmos-elevation-angles.xlsx columns:
+ToaWattTot ... LpathQ, effTauSun, effTau300.  The effective
+transmittance is calculated for any list of source temperatures, with the
+cached Planck weighting tables in planck.py.
+"""
+
+import numpy as np
+
+import stdatmos.planck as planck
+
+#source temperatures for the effective transmittance
+effTemps = [6000., 300.]
+
+#the integrated quantities, in the order of the spreadsheet columns
+resultColumns = ['ToaWattTot', 'ToaWatt', 'BoaWattTot', 'BoaWatt', 'LpathWatt',
+  'ToaQTot', 'ToaQ', 'BoaQTot', 'BoaQ', 'LpathQ', 'effTauSun', 'effTau300']
+
+###############################################################
+def effColumn(temp):
+  """Returns the column name of the effective transmittance for a source
+  temperature: effTauSun for 6000 K, else e.g. effTau300
+  """
+  return 'effTauSun' if temp == 6000. else 'effTau{:g}'.format(temp)
+
+###############################################################
+def resultColumnsFor(temps):
+  """Returns the integrated quantities for the source temperatures temps
+  """
+  return resultColumns[:10] + [effColumn(temp) for temp in temps]
+
+###############################################################
+def trapzAreas(y, x):
+  """Trapezoid areas of y(x) between neighbouring samples, along the
+  last axis.  y has shape (..., N), x has shape (N,).  A zero is appended,
+  so that the result also has shape (..., N).
+  """
+  areas = np.zeros(y.shape)
+  areas[..., :-1] = 0.5 * (y[..., 1:] + y[..., :-1]) * np.diff(x)
+  return areas
+
+###############################################################
+def bandEdges(freq, specranges, keys):
+  """Returns the first and last index of freq in each band.
+  freq is in cm-1 and increasing, specranges[key] = [start um, end um].
+  """
+  lo = np.array([np.searchsorted(freq, 1e4 / specranges[key][1], side='left') for key in keys])
+  hi = np.array([np.searchsorted(freq, 1e4 / specranges[key][0], side='right') - 1 for key in keys])
+  return lo, hi
+
+###############################################################
+def bandIntegrate(areas, lo, hi):
+  """Band integrals from the trapezoid areas (..., N), see trapzAreas,
+  for the bands between sample indices lo and hi.
+  Returns shape (..., nbands), bands with fewer than two samples are zero.
+  """
+  nfreq = areas.shape[-1]
+  valid = hi > lo
+  #reduceat sums areas[lo:hi] for the even indices, the odd ones are discarded
+  indices = np.clip(np.column_stack((lo, hi)).ravel(), 0, nfreq - 1)
+  sums = np.add.reduceat(areas, indices, axis=-1)[..., ::2]
+  return np.where(valid, sums, 0.)
+
+###############################################################
+def bandIntegrals(freq, trans, toasun, pathrad, specranges, keys=None, temps=None):
+  """Integrates a stack of spectra over all bands in specranges.
+  freq: wavenumber grid in cm-1 (N,)
+  trans: transmittance (nfiles, N)
+  toasun, pathrad: top of atmosphere sun and path radiance in W/(m2.sr.cm-1) (nfiles, N)
+  temps: source temperatures for the effective transmittance, default effTemps
+  Returns a dict with an array (nfiles, nbands) for each of resultColumnsFor(temps),
+  the total values are the same for all bands.
+  """
+  if temps is None:
+    temps = effTemps
+  if keys is None:
+    keys = list(specranges.keys())
+  lo, hi = bandEdges(freq, specranges, keys)
+  nbands = len(keys)
+
+  # convert radiance terms to photon rates, while it is still spectral
+  import scipy.constants as const
+  conv = freq * const.h * const.c * 1e2
+  boasun = trans * toasun
+  watt = np.stack([toasun, boasun, pathrad])
+
+  results = {}
+  for areas, unit in [(trapzAreas(watt, freq), 'Watt'), (trapzAreas(watt / conv, freq), 'Q')]:
+    band = bandIntegrate(areas, lo, hi)
+    total = np.repeat(areas.sum(axis=-1, keepdims=True), nbands, axis=-1)
+    results['Toa{}Tot'.format(unit)] = total[0]
+    results['Toa{}'.format(unit)] = band[0]
+    results['Boa{}Tot'.format(unit)] = total[1]
+    results['Boa{}'.format(unit)] = band[1]
+    results['Lpath{}'.format(unit)] = band[2]
+
+  #effective transmittance, weighted by the source spectral radiance
+  efftau = planck.effectiveTransmittance(freq, trans, specranges, temps, keys)
+  for i, temp in enumerate(temps):
+    results[effColumn(temp)] = efftau[:, i, :]
+
+  return results
+
+###############################################################
+def stackSpectra(datasets):
+  """Groups 2-D tape7 arrays (first column FREQ) by wavenumber grid.
+  Yields (freq, indices into datasets, stack (nfiles, N, ncols)).
+  Tape7 files from the same template share the grid, so normally
+  there is only one group.
+  """
+  groups = []
+  for i, dataset in enumerate(datasets):
+    for freq, indices in groups:
+      if freq.shape == dataset[:, 0].shape and np.array_equal(freq, dataset[:, 0]):
+        indices.append(i)
+        break
+    else:
+      groups.append((dataset[:, 0], [i]))
+  for freq, indices in groups:
+    yield freq, indices, np.stack([datasets[i] for i in indices])
@@ -0,0 +1,133 @@
+"""Lookup table of the wideband elevation sweep results, for simulations.
+
+The results of domodtran-elevation.py (effTauSun, effTau300, LpathWatt etc.
+per Atmo, Altitude, Zenith and SpecBand) are held in a dense grid
+
+  values[quantity, atmosphere, band, altitude, zenith]
+
+The altitude and zenith grids need not be uniform, such as the elevs
+grid in domodtran-elevation.py built from linspace segments.
+Lookups are vectorised: the atmosphere, band, altitude and zenith can all
+be arrays (broadcast against each other), the values are interpolated
+linearly in altitude and zenith.  Queries outside the grid are clamped
+to the grid edges, grid points without results are NaN.  A NaN grid point
+only gives NaN for the queries that it has a weight in, so a query on a
+grid point with results next to a missing one is not NaN.
+
+  import stdatmos.lut as lut
+  table = lut.AtmoLUT.load('atmos-elevation-angles.npz')
+  tau = table.lookup('effTauSun', 'TropicalRural', 'MWIR', alts, zeniths)
+
+The table is saved as a single uncompressed .npz file, for fast loading.
+"""
+
+import numpy as np
+
+keyColumns = ['Atmo', 'Altitude', 'Zenith', 'SpecBand']
+
+###############################################################
+def gridIndex(grid, x):
+  """Returns the lower index and interpolation weight of x in the
+  increasing grid, clamping x to the grid edges.
+  """
+  x = np.clip(np.asarray(x, dtype=np.float64), grid[0], grid[-1])
+  if grid.shape[0] == 1:
+    return np.zeros(x.shape, dtype=np.intp), np.zeros(x.shape)
+  i = np.clip(np.searchsorted(grid, x, side='right') - 1, 0, grid.shape[0] - 2)
+  w = (x - grid[i]) / (grid[i+1] - grid[i])
+  return i, w
+
+###############################################################
+def bilinear(v00, v01, v10, v11, w0, w1):
+  """Returns the values at the corners (lower and upper index of each
+  axis) interpolated with the weights w0 and w1 of the two axes.  A corner
+  with zero weight is left out, so that its value may be NaN.
+  """
+  total = 0.
+  for value, weight in [(v00, (1 - w0) * (1 - w1)), (v01, (1 - w0) * w1),
+                        (v10, w0 * (1 - w1)), (v11, w0 * w1)]:
+    total = total + np.where(weight > 0, weight * value, 0.)
+  return total
+
+###############################################################
+class AtmoLUT(object):
+  """Dense lookup table over (atmosphere, band, altitude, zenith)
+  """
+
+  def __init__(self, quantities, atmos, bands, alts, zeniths, values):
+    self.quantities = list(quantities)
+    self.atmos = list(atmos)
+    self.bands = list(bands)
+    self.alts = np.asarray(alts, dtype=np.float64)
+    self.zeniths = np.asarray(zeniths, dtype=np.float64)
+    self.values = np.ascontiguousarray(values, dtype=np.float64)
+
+  @classmethod
+  def fromFrame(cls, df, quantities=None):
+    """Builds the table from a DataFrame with the keyColumns and quantities,
+    e.g. resultstore.ResultStore.readFrame().
+    """
+    if quantities is None:
+      quantities = [col for col in df.columns if col not in keyColumns]
+    atmos = sorted(df['Atmo'].unique())
+    bands = sorted(df['SpecBand'].unique())
+    alts = np.unique(df['Altitude'].values.astype(np.float64))
+    zeniths = np.unique(df['Zenith'].values.astype(np.float64))
+    values = np.full((len(quantities), len(atmos), len(bands), len(alts), len(zeniths)), np.nan)
+    ia = np.searchsorted(atmos, df['Atmo'].values)
+    ib = np.searchsorted(bands, df['SpecBand'].values)
+    ih = np.searchsorted(alts, df['Altitude'].values.astype(np.float64))
+    iz = np.searchsorted(zeniths, df['Zenith'].values.astype(np.float64))
+    for iq, quantity in enumerate(quantities):
+      values[iq, ia, ib, ih, iz] = df[quantity].values
+    return cls(quantities, atmos, bands, alts, zeniths, values)
+
+  @classmethod
+  def fromStore(cls, dbfile, quantities=None):
+    """Builds the table from a resultstore SQLite file
+    """
+    import stdatmos.resultstore as resultstore
+    store = resultstore.ResultStore(dbfile, [])
+    df = store.readFrame()
+    store.close()
+    return cls.fromFrame(df, quantities)
+
+  def save(self, filename):
+    np.savez(filename, quantities=np.array(self.quantities), atmos=np.array(self.atmos),
+      bands=np.array(self.bands), alts=self.alts, zeniths=self.zeniths, values=self.values)
+
+  @classmethod
+  def load(cls, filename):
+    with np.load(filename) as data:
+      return cls(data['quantities'].tolist(), data['atmos'].tolist(), data['bands'].tolist(),
+        data['alts'], data['zeniths'], data['values'])
+
+  def index(self, names, items):
+    """Returns the indices of items (names or integer indices) in names,
+    raises KeyError for a name that is not in names
+    """
+    items = np.asarray(items)
+    if items.dtype.kind in 'iu':
+      return items
+    names = np.asarray(names)
+    order = np.argsort(names)
+    pos = np.clip(np.searchsorted(names[order], items), 0, names.shape[0] - 1)
+    found = names[order][pos] == items
+    if not np.all(found):
+      raise KeyError(items[~found].ravel()[0] if items.ndim else items.item())
+    return order[pos]
+
+  def lookup(self, quantity, atmo, band, alt, zenith):
+    """Returns the quantity interpolated to the altitudes and zenith angles.
+    atmo and band are names or indices, all arguments except quantity can
+    be arrays, which are broadcast against each other.
+    """
+    ia, ib, alt, zenith = np.broadcast_arrays(self.index(self.atmos, atmo),
+      self.index(self.bands, band), alt, zenith)
+    table = self.values[self.quantities.index(quantity)]
+    ih, wh = gridIndex(self.alts, alt)
+    iz, wz = gridIndex(self.zeniths, zenith)
+    ih1 = np.minimum(ih + 1, self.alts.shape[0] - 1)
+    iz1 = np.minimum(iz + 1, self.zeniths.shape[0] - 1)
+    return bilinear(table[ia, ib, ih, iz], table[ia, ib, ih, iz1], table[ia, ib, ih1, iz],
+      table[ia, ib, ih1, iz1], wh, wz)
@@ -0,0 +1,151 @@
+"""Streaming post-processing of the tape7 files, as the modtran runs complete.
+
+Each stage is a generator that takes the cases from the previous stage
+one at a time, so that a tape7 is processed as soon as its run completes
+and only a few spectra are in memory at any time.  Results are written
+to disk as they arrive, so a long sweep can be inspected while it runs,
+and sweeps larger than memory can be processed.
+
+A case is a tuple (datadir, meta, data), with meta the scenario, altitude
+and elevation/range (see tape7store.caseMeta) and data a 2-D array with
+the wavenumber or wavelength in the first column.
+
+The 1 km transmittance of domodtran.py is calculated from the completed
+runs of a scenario, all its altitudes at once, see tau1km.py.
+
+The wideband integrals of domodtran-elevation.py:
+
+  cases = loadCases(runCases(datadirs, modtranexe), integrateColumns)
+  nrows = storeRows(integrateCases(cases, specranges, temps), store)
+
+or of the tape7 files of earlier runs, e.g. from a run-only sweep (see
+runsweep.py), with integrateExisting.
+
+scipy is imported only by the integration, so that the run stage starts
+quickly.
+"""
+
+import os
+import numpy as np
+
+import stdatmos.instrument as instrument
+import stdatmos.integrate as integrate
+import stdatmos.runner as runner
+import stdatmos.scheduler as scheduler
+import stdatmos.tape7store as tape7store
+
+#tape7 columns needed by integrateCases
+integrateColumns = ['FREQ', 'TOT_TRANS', 'TOA_SUN', 'TOTAL_RAD']
+
+###############################################################
+def runCases(datadirs, modtranexe, modtranbin=None, nproc=None, timeout=None,
+             resultcache=None, stagelog=None):
+  """Runs modtran on the cases in parallel, see scheduler.iterJobs.
+  Yields the datadir of each case as soon as its run completed successfully.
+  The runs are written to stagelog (an instrument.StageLog) if given.
+  """
+  for result in scheduler.iterJobs(datadirs, modtranexe, modtranbin, nproc, timeout,
+                                   resultcache=resultcache):
+    runner.reportResult(result)
+    if stagelog is not None:
+      stagelog.writeResult(result)
+    if result.returncode == 0:
+      yield result.datadir
+
+###############################################################
+def loadCases(datadirs, colspec, stagelog=None):
+  """Yields (datadir, meta, tape7 columns in colspec) for each datadir
+  """
+  for datadir in datadirs:
+    with instrument.stage(stagelog, 'loadtape7', datadir):
+      meta = tape7store.caseMeta(datadir)
+      data = tape7store.loadTape7(datadir, colspec, meta)
+    yield datadir, meta, data
+
+###############################################################
+def integrateCases(cases, specranges, temps=None, batchsize=16, stagelog=None):
+  """Integrates the cases over the spectral ranges, batchsize cases at a time.
+  The data columns are integrateColumns, radiances in W/(cm2.sr.cm-1).
+  Yields result rows [Atmo, Altitude, Zenith, SpecBand, quantities...],
+  with the quantities in integrate.resultColumnsFor(temps).
+  The integration time of a batch is shared evenly between its cases in stagelog.
+  """
+  if temps is None:
+    temps = integrate.effTemps
+  keys = list(specranges.keys())
+  columns = integrate.resultColumnsFor(temps)
+
+  def integrateBatch(batch):
+    if stagelog is None:
+      return integrateRows(batch)
+    before = instrument.resourceUsage()
+    rows = integrateRows(batch)
+    stagelog.writeBatch('integrate', [datadir for datadir, meta, data in batch],
+      instrument.usageDelta(before, instrument.resourceUsage()))
+    return rows
+
+  def integrateRows(batch):
+    freq = batch[0][2][:,0]
+    tape7s = np.stack([data for datadir, meta, data in batch])
+    #convert from /cm2 to /m2
+    results = integrate.bandIntegrals(freq, tape7s[:,:,1], tape7s[:,:,2] * 1e4,
+      tape7s[:,:,3] * 1e4, specranges, keys, temps)
+    rows = []
+    for j, (datadir, meta, data) in enumerate(batch):
+      for k, key in enumerate(keys):
+        rows.append([meta['scenario'], meta['altitude'], meta['elevation'], key]
+          + [results[col][j,k] for col in columns])
+    return rows
+
+  batch = []
+  for case in cases:
+    #a batch must share the wavenumber grid
+    if batch and not np.array_equal(batch[0][2][:,0], case[2][:,0]):
+      for row in integrateBatch(batch):
+        yield row
+      batch = []
+    batch.append(case)
+    if len(batch) >= batchsize:
+      for row in integrateBatch(batch):
+        yield row
+      batch = []
+  if batch:
+    for row in integrateBatch(batch):
+      yield row
+
+###############################################################
+def storeRows(rows, store, batchsize=100):
+  """Appends the rows to store (a resultstore.ResultStore), batchsize rows
+  at a time.  Returns the number of rows added to the store.
+  """
+  nadded = 0
+  batch = []
+  for row in rows:
+    batch.append(row)
+    if len(batch) >= batchsize:
+      nadded += store.appendRows(batch)
+      batch = []
+  if batch:
+    nadded += store.appendRows(batch)
+  return nadded
+
+###############################################################
+def integrateExisting(directory, alt, specranges, store, temps=None, sweepdir='elev',
+                      stagelog=None):
+  """Integrates the tape7 files in <directory>/<sweepdir>/<alt>/<elev> and
+  appends the results to store (a resultstore.ResultStore), without
+  running modtran.  Elevations already in the store for all spectral
+  ranges are skipped.  Returns the number of rows added to the store.
+  """
+  dirname = os.path.join('.', directory, sweepdir, '{:.0f}'.format(alt))
+  existing = store.existingKeys(directory, alt)
+  datadirs = []
+  for name in sorted(os.listdir(dirname)):
+    datadir = os.path.join(dirname, name)
+    if not os.path.exists(os.path.join(datadir, 'tape7')):
+      continue
+    if all([(float(name), key) in existing for key in specranges]):
+      continue
+    datadirs.append(datadir)
+  cases = loadCases(datadirs, integrateColumns, stagelog)
+  return storeRows(integrateCases(cases, specranges, temps, stagelog=stagelog), store)
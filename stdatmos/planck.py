@@ -0,0 +1,80 @@
+"""Cached Planck weighting tables for effective transmittance.
+
+The effective transmittance of a band for a source at temperature T is
+
+  effTau = int(L(T) tau dv) / int(L(T) dv)
+
+integrated with the trapezoid rule over the samples in the band.  This is
+a weighted sum over the samples tau_i, with weights w_i = a_i L_i / sum(a_i L_i)
+where a_i are the trapezoid weights of the samples in the band.
+The weights depend only on the wavenumber grid, the band and the source
+temperature, not on the tape7 file.  They are calculated once and kept in
+a table, keyed by grid, bands and temperatures.
+
+The effective transmittance of a stack of spectra (files x wavenumbers)
+for all bands and temperatures is then one matrix product.
+"""
+
+import hashlib
+from collections import namedtuple
+import numpy as np
+
+PlanckTable = namedtuple('PlanckTable', ['temps', 'keys', 'weights', 'integrals'])
+
+#tables already calculated, keyed by (grid, bands, temperatures)
+planckTables = {}
+
+###############################################################
+def gridKey(freq):
+  """Returns a key that identifies the wavenumber grid
+  """
+  freq = np.ascontiguousarray(freq, dtype=np.float64)
+  return hashlib.sha1(freq.tobytes()).hexdigest()
+
+###############################################################
+def trapzWeights(freq, lo, hi):
+  """Returns the trapezoid weights of the samples lo..hi (inclusive) of freq,
+  zero outside the band.  sum(weights * y) = np.trapz(y[lo:hi+1], freq[lo:hi+1])
+  """
+  weights = np.zeros(freq.shape)
+  if hi > lo:
+    dv = np.diff(freq[lo:hi+1])
+    weights[lo:hi] += 0.5 * dv
+    weights[lo+1:hi+1] += 0.5 * dv
+  return weights
+
+###############################################################
+def planckTable(freq, specranges, temps, keys=None):
+  """Returns the PlanckTable for the wavenumber grid freq (cm-1, increasing),
+  the bands in specranges and the source temperatures temps (K).
+  weights has shape (ntemps, nbands, N), normalised to sum to one per band;
+  integrals holds the band radiance integrals in W/(m2.sr) (ntemps, nbands).
+  """
+  if keys is None:
+    keys = list(specranges.keys())
+  bands = tuple([(key, specranges[key][0], specranges[key][1]) for key in keys])
+  tablekey = (gridKey(freq), bands, tuple(temps))
+  if tablekey not in planckTables:
+    import pyradi.ryplanck as ryplanck
+    import stdatmos.integrate as integrate
+    lo, hi = integrate.bandEdges(freq, specranges, keys)
+    bandweights = np.array([trapzWeights(freq, l, h) for l, h in zip(lo, hi)])
+    weights = np.zeros((len(temps), len(keys), freq.shape[0]))
+    integrals = np.zeros((len(temps), len(keys)))
+    for i, temp in enumerate(temps):
+      weights[i] = bandweights * ryplanck.planck(freq, temp, 'en')
+      integrals[i] = weights[i].sum(axis=-1)
+      with np.errstate(invalid='ignore', divide='ignore'):
+        weights[i] /= integrals[i].reshape(-1, 1)
+    planckTables[tablekey] = PlanckTable(list(temps), list(keys), weights, integrals)
+  return planckTables[tablekey]
+
+###############################################################
+def effectiveTransmittance(freq, trans, specranges, temps, keys=None):
+  """Returns the effective transmittance of the spectra trans (nfiles, N)
+  for all bands and temperatures, shape (nfiles, ntemps, nbands).
+  """
+  table = planckTable(freq, specranges, temps, keys)
+  ntemps, nbands, nfreq = table.weights.shape
+  efftau = np.dot(trans, table.weights.reshape(-1, nfreq).T)
+  return efftau.reshape(-1, ntemps, nbands)
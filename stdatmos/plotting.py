@@ -0,0 +1,138 @@
+"""Batch plotting of the 1 km transmittance, in worker processes.
+
+domodtran.py plots the altitudes of each scenario (<dir>/<dir>.png) and
+the scenarios at each altitude (AllScen-<alt>m.png).  Here each spectrum
+is read once from the scenario stores (tau1km.py) into one shared array,
+a memory-mapped .npy file (ndirs, nalts, wlnum) like the cube chunks in
+cube.py.  The figures are rendered from the shared array by a pool of
+worker processes, each worker maps the array and touches only the
+spectra of the figure it renders:
+
+  filenames = plotting.plotTau(alts, dirs, nproc=4)
+
+The figures are matplotlib Figures on the Agg canvas, not pyplot figures,
+so they are never shown and there is no figure registry to fill up:
+each figure is cleared as soon as it is saved, and the time and memory
+per figure do not depend on the number of scenarios plotted before.
+matplotlib is imported only in the workers.
+"""
+
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+import stdatmos.tau1km as tau1km
+
+figSize = (12, 6)
+figDPI = 300 #as ryplot.Plotter.saveFig
+legendAlpha = 0.5
+
+#the shared arrays mapped by this (worker) process, keyed by filename
+sharedArrays = {}
+
+###############################################################
+def stackScenarios(dirs, alts, stackdir):
+  """Reads the 1 km transmittance of the altitudes of each scenario once
+  into the shared arrays stackdir/WAVELENGTH.npy (ndirs, wlnum) and
+  stackdir/TAU1KM.npy (ndirs, nalts, wlnum), one scenario at a time.
+  Altitudes missing in a scenario are NaN.
+  """
+  wlfile = os.path.join(stackdir, 'WAVELENGTH.npy')
+  taufile = os.path.join(stackdir, 'TAU1KM.npy')
+  wlstack, taustack = None, None
+  for i, directory in enumerate(dirs):
+    salts, wl, tau = tau1km.readScenario(directory)
+    if wlstack is None:
+      wlstack = np.lib.format.open_memmap(wlfile, mode='w+', dtype=np.float64,
+        shape=(len(dirs), wl.shape[0]))
+      taustack = np.lib.format.open_memmap(taufile, mode='w+', dtype=np.float64,
+        shape=(len(dirs), len(alts), wl.shape[0]))
+    elif wl.shape[0] != wlstack.shape[1]:
+      raise ValueError('{} has {} wavelengths, not {}'.format(directory, wl.shape[0],
+        wlstack.shape[1]))
+    wlstack[i] = wl
+    for j, alt in enumerate(alts):
+      taustack[i, j] = tau[salts.index(alt)] if alt in salts else np.nan
+  if wlstack is not None:
+    wlstack.flush()
+    taustack.flush()
+  del wlstack, taustack
+  return wlfile, taufile
+
+###############################################################
+def figureJobs(alts, dirs, wlfile, taufile, outdir='.'):
+  """Returns the figures to plot, each a dict with the filename, title and
+  curves, a list of (scenario index, altitude index, label)
+  """
+  jobs = []
+  #the different altitudes for each atmosphere
+  for i, directory in enumerate(dirs):
+    jobs.append({'filename':os.path.join(outdir, directory, '{}.png'.format(directory)),
+      'title':'{} {} 1 km transmittance, 135 deg zenith'.format(directory, directory),
+      'curves':[(i, j, '{} m'.format(alt)) for j, alt in enumerate(alts)]})
+  #the different atmospheres for each altitude
+  for j, alt in enumerate(alts):
+    jobs.append({'filename':os.path.join(outdir, 'AllScen-{}m.png'.format(alt)),
+      'title':'{} m altitude, 135 deg zenith 1 km transmittance'.format(alt),
+      'curves':[(i, j, '{} {}'.format(directory, directory)) for i, directory in enumerate(dirs)]})
+  for job in jobs:
+    job.update(wlfile=wlfile, taufile=taufile)
+  return jobs
+
+###############################################################
+def sharedArray(filename):
+  """Returns the shared array in filename, memory-mapped once per process
+  """
+  if filename not in sharedArrays:
+    sharedArrays[filename] = np.load(filename, mmap_mode='r')
+  return sharedArrays[filename]
+
+###############################################################
+def renderFigure(job):
+  """Renders one figure of figureJobs to its png file, returns the filename
+  """
+  from matplotlib.figure import Figure
+  from matplotlib.backends.backend_agg import FigureCanvasAgg
+  wl = sharedArray(job['wlfile'])
+  tau = sharedArray(job['taufile'])
+  fig = Figure(figsize=figSize)
+  FigureCanvasAgg(fig)
+  ax = fig.add_subplot(1, 1, 1)
+  for i, j, label in job['curves']:
+    ax.plot(wl[i], tau[i, j], label=label)
+  ax.set_title(job['title'])
+  ax.set_xlabel('Wavelength $\\mu$m')
+  ax.set_ylabel('Transmittance')
+  ax.grid(True)
+  ax.legend(framealpha=legendAlpha)
+  fig.savefig(job['filename'], dpi=figDPI, bbox_inches='tight')
+  fig.clear()
+  return job['filename']
+
+###############################################################
+def plotTau(alts, dirs, nproc=None, outdir='.'):
+  """Plots the 1 km transmittance of the altitudes of each scenario to
+  <dir>/<dir>.png, and of the scenarios at each altitude to AllScen-<alt>m.png,
+  on nproc worker processes (default the number of cores, 1 plots in this
+  process).  Returns the filenames of the figures.
+  """
+  if not dirs:
+    return []
+  stackdir = tempfile.mkdtemp(prefix='plot1km-', dir=outdir)
+  try:
+    wlfile, taufile = stackScenarios(dirs, alts, stackdir)
+    jobs = figureJobs(alts, dirs, wlfile, taufile, outdir)
+    if nproc is None:
+      nproc = os.cpu_count() or 1
+    nproc = min(nproc, len(jobs))
+    if nproc == 1:
+      filenames = [renderFigure(job) for job in jobs]
+    else:
+      with ProcessPoolExecutor(max_workers=nproc) as executor:
+        filenames = list(executor.map(renderFigure, jobs))
+  finally:
+    sharedArrays.clear()
+    shutil.rmtree(stackdir, ignore_errors=True)
+  return filenames
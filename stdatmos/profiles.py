@@ -0,0 +1,241 @@
+"""Catalogue of the scenario atmosphere profiles, and perturbed profiles.
+
+Each scenario directory has a numeric profile <dir>/<dir>-profile.txt,
+one level per line: altitude (km), pressure (mb), temperature (K) and
+relative humidity (%).  The profiles of all the scenarios are read into
+one catalogue, an array (natmos, maxlevels, 4) padded with NaN, with the
+descriptions from ModelSummary.atmospheres:
+
+  catalogue = profiles.loadCatalogue()
+  levels = catalogue.profile('ExtremeHumidity')    #(nlevels, 4)
+
+The profile embedded in a tape5 template (MODEL 7 with the CARD2C levels,
+e.g. ExtremeHumidity.ltn) is read in the same units by readTape5Profile,
+converting from the template units in JCHAR (pressure in mb, atm or torr,
+temperature in K or C, water vapour as relative humidity).
+
+Perturbed profiles, e.g. scaled humidity or shifted temperature, are
+rendered into the profile block of a template, the levels of all the
+cases formatted at once:
+
+  perturbed = catalogue.perturbed(rhscale=[0.8, 1.0, 1.2], tshift=0.)
+  template = tape5.loadTemplate('ExtremeHumidity/ExtremeHumidity.ltn')
+  texts = profiles.renderProfiles(template, perturbed.levels)
+
+Only the MODEL 7 templates with a CARD2C profile can be rendered:
+ExtremeHotLowHumidity.ltn and ExtremeHumidity.ltn.  The levels keep the
+altitudes (ZM) of the template: each profile is interpolated to them,
+pressure log-linear and temperature and humidity linear in altitude, and
+the first or last level of the profile is held outside its altitudes.
+All the profile text files have 36 levels, the first at 0.1 km with the
+surface values of the templates at 0 km, so these are rendered at the
+template surface.  The NaN padding of the catalogue levels is dropped.
+Only P, T and WMOL1 (H2O) of each level are written, the other species
+and JCHAR are copied from the template levels.
+"""
+
+import os
+import numpy as np
+
+import stdatmos.tape5 as tape5
+
+#the catalogue columns and their units
+profileColumns = ['ZM', 'P', 'T', 'RH']
+profileUnits = ['km', 'mb', 'K', '%']
+
+#JCHAR unit codes: pressure to mb, temperature offset to K
+pressureUnits = {'A':1., 'B':1013.25, 'C':1013.25 / 760.}
+temperatureUnits = {'A':0., 'B':273.15}
+
+###############################################################
+def profileFile(directory):
+  return os.path.join(directory, '{}-profile.txt'.format(os.path.basename(directory)))
+
+###############################################################
+def readProfileText(filename):
+  """Returns the levels (nlevels, 4) in a profile text file
+  """
+  return np.fromfile(filename, sep=' ').reshape(-1, len(profileColumns))
+
+###############################################################
+class ProfileCatalogue(object):
+  """Profiles of a number of atmospheres, see the module docstring.
+  levels has shape (natmos, maxlevels, 4), padded with NaN after the
+  nlevels[i] levels of atmosphere i.
+  """
+
+  def __init__(self, names, descriptions, levels, nlevels):
+    self.names = list(names)
+    self.descriptions = list(descriptions)
+    self.levels = levels
+    self.nlevels = np.asarray(nlevels)
+
+  def __len__(self):
+    return len(self.names)
+
+  def index(self, name):
+    return self.names.index(name)
+
+  def profile(self, name):
+    """Returns the levels (nlevels, 4) of the atmosphere name
+    """
+    i = self.index(name)
+    return self.levels[i, :self.nlevels[i]]
+
+  def column(self, name):
+    """Returns the column name (ZM, P, T or RH) of all atmospheres (natmos, maxlevels)
+    """
+    return self.levels[..., profileColumns.index(name)]
+
+  def perturbed(self, rhscale=1., tshift=0., names=None):
+    """Returns a catalogue of the atmospheres in names (default all) with
+    the relative humidity scaled by rhscale (clipped to 0-100 %) and the
+    temperature shifted by tshift K.  rhscale and tshift can be arrays, each
+    value gives a perturbed copy of each atmosphere, in the order
+    (perturbation, atmosphere).
+    """
+    if names is None:
+      names = self.names
+    idx = [self.index(name) for name in names]
+    rhscale, tshift = np.broadcast_arrays(np.atleast_1d(rhscale).astype(np.float64),
+      np.atleast_1d(tshift).astype(np.float64))
+    levels = np.repeat(self.levels[idx][np.newaxis], rhscale.shape[0], axis=0)
+    levels[..., 3] = np.clip(levels[..., 3] * rhscale.reshape(-1, 1, 1), 0., 100.)
+    levels[..., 2] += tshift.reshape(-1, 1, 1)
+    labels = ['{} RHx{:g} T{:+g}K'.format(name, s, t) for s, t in zip(rhscale, tshift)
+      for name in names]
+    descriptions = [self.descriptions[i] for s in rhscale for i in idx]
+    return ProfileCatalogue(labels, descriptions, levels.reshape(-1, *self.levels.shape[1:]),
+      np.tile(self.nlevels[idx], rhscale.shape[0]))
+
+###############################################################
+def loadCatalogue(rootdir='.', atmospheres=None):
+  """Reads the profile text files of the atmospheres into a catalogue.
+  atmospheres is a dict of name: [description], default ModelSummary.atmospheres.
+  """
+  if atmospheres is None:
+    import ModelSummary
+    atmospheres = ModelSummary.atmospheres
+  names = sorted(atmospheres.keys())
+  profiles = [readProfileText(profileFile(os.path.join(rootdir, name))) for name in names]
+  nlevels = [profile.shape[0] for profile in profiles]
+  levels = np.full((len(names), max(nlevels), len(profileColumns)), np.nan)
+  for i, profile in enumerate(profiles):
+    levels[i, :nlevels[i]] = profile
+  descriptions = [atmospheres[name][0] for name in names]
+  return ProfileCatalogue(names, descriptions, levels, nlevels)
+
+###############################################################
+def templateUnits(template):
+  """Returns the pressure factor to mb and temperature offset to K of the
+  template profile, from the JCHAR of its first level
+  """
+  if template.card2c is None:
+    raise ValueError('the template has no profile (CARD2C)')
+  jchar = template.profile[0][0]['JCHAR'].strip().upper().ljust(3)
+  if jchar[0] not in pressureUnits or jchar[1] not in temperatureUnits or jchar[2] != 'H':
+    raise ValueError('JCHAR {} is not supported, only pressure A-C, temperature A-B and '
+      'relative humidity H'.format(jchar))
+  return pressureUnits[jchar[0]], temperatureUnits[jchar[1]]
+
+###############################################################
+def readTape5Profile(template):
+  """Returns the levels (nlevels, 4) of the profile in the template, a
+  tape5.Tape5 or a filename, in the catalogue units
+  """
+  if not isinstance(template, tape5.Tape5):
+    template = tape5.loadTemplate(template)
+  pfactor, toffset = templateUnits(template)
+  return np.array([[card['ZM'], card['P'] * pfactor, card['T'] + toffset, card['WMOL1']]
+    for card, extra in template.profile])
+
+###############################################################
+def formatColumn(name, values, width, style):
+  """Returns the values formatted in width columns, as a string array of
+  the same shape.  Values are written with the decimals of the template
+  style, or fewer where needed to fit, see tape5.formatField.
+  """
+  fmt, decimals = style
+  text = np.char.mod('%{}.{}{}'.format(width, decimals, fmt), values)
+  for ndec in range(decimals - 1, -1, -1):
+    wide = np.char.str_len(text) > width
+    if not wide.any():
+      break
+    text[wide] = np.char.mod('%{}.{}{}'.format(width, ndec, fmt), values[wide])
+  if (np.char.str_len(text) > width).any():
+    raise ValueError('{} = {!r} is wider than {} columns'.format(name,
+      values[np.char.str_len(text) > width][0], width))
+  return text
+
+###############################################################
+def templateLevels(template, levels):
+  """Returns the levels (ncases, nlevels, 4) in the catalogue units
+  interpolated to the altitudes of the template levels, see the module
+  docstring
+  """
+  levels = np.asarray(levels, dtype=np.float64)
+  if levels.ndim == 2:
+    levels = levels[np.newaxis]
+  zm = np.array([card['ZM'] for card, extra in template.profile], dtype=np.float64)
+  out = np.empty((levels.shape[0], zm.shape[0], len(profileColumns)))
+  out[..., 0] = zm
+  for i, case in enumerate(levels):
+    case = case[~np.isnan(case).any(axis=1)]
+    if case.shape[0] < 2:
+      raise ValueError('profile {} has fewer than two levels'.format(i))
+    out[i, :, 1] = np.exp(np.interp(zm, case[:, 0], np.log(case[:, 1])))
+    out[i, :, 2] = np.interp(zm, case[:, 0], case[:, 2])
+    out[i, :, 3] = np.interp(zm, case[:, 0], case[:, 3])
+  return out
+
+###############################################################
+def levelLines(template, levels):
+  """Returns the CARD2C1 lines (ncases, nlevels) for the levels (ncases,
+  nlevels, 4) in the catalogue units, interpolated to the template
+  altitudes and formatted for the template
+  """
+  pfactor, toffset = templateUnits(template)
+  levels = templateLevels(template, levels)
+  values = {'ZM':levels[..., 0], 'P':levels[..., 1] / pfactor, 'T':levels[..., 2] - toffset,
+    'WMOL1':levels[..., 3]}
+  card = template.profile[0][0]
+  lines = None
+  end = 0
+  for field in ['ZM', 'P', 'T', 'WMOL1']:
+    start, width, kind, style = card.fields[field]
+    text = formatColumn(field, values[field], width, style)
+    lines = text if lines is None else np.char.add(lines, text)
+    end = start + width
+  #the rest of each line from the template level
+  rest = np.array([card.line[end:] for card, extra in template.profile])
+  return np.char.add(lines, rest)
+
+###############################################################
+def renderProfiles(template, levels, **fields):
+  """Returns the tape5 texts of the template with its profile levels
+  replaced by each of the profiles in levels (ncases, nlevels, 4), in the
+  catalogue units, interpolated to the template altitudes, and the fields
+  changed, see tape5.Tape5.render
+  """
+  return [template.render(levels=list(lines), **fields) for lines in levelLines(template, levels)]
+
+###############################################################
+def writeProfiles(template, levels, dirnames, **fields):
+  """Writes the tape5 of each of the profiles in levels to the directories
+  dirnames, see renderProfiles.  Returns dirnames.
+  """
+  for dirname, text in zip(dirnames, renderProfiles(template, levels, **fields)):
+    if not os.path.exists(dirname):
+      os.makedirs(dirname)
+    with open(os.path.join(dirname, 'tape5'), 'w') as fout:
+      fout.write(text)
+  return dirnames
+
+##########################################################################################################
+if __name__ == '__main__':
+  catalogue = loadCatalogue()
+  for i, name in enumerate(catalogue.names):
+    levels = catalogue.profile(name)
+    print('{:24s} {:3d} levels {:6.1f}-{:5.1f} km  surface {:7.1f} mb {:6.1f} K {:5.1f} %  {}'.format(
+      name, catalogue.nlevels[i], levels[0, 0], levels[-1, 0], levels[0, 1], levels[0, 2],
+      levels[0, 3], catalogue.descriptions[i]))
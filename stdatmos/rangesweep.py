@@ -0,0 +1,175 @@
+"""Horizontal path spectra for an array of ranges from one run per altitude.
+
+A horizontal path at one altitude is (nearly) homogeneous, so the
+spectra for any range R follow from a modtran run at a reference range
+R0, sample by sample:
+
+ - optical depth and transmittance (Beer-Lambert):
+     DEPTH(R) = DEPTH(R0) R/R0,  TOT_TRANS(R) = exp(-DEPTH(R))
+ - path radiance, the source function of the path times (1 - tau):
+     L(R) = L(R0) (1 - TOT_TRANS(R)) / (1 - TOT_TRANS(R0))
+   for pathColumns, and for TOTAL_RAD less the surface terms,
+ - radiance from the end of the path, attenuated by the path:
+     L(R) = L(R0) TOT_TRANS(R) / TOT_TRANS(R0)
+   for surfaceColumns.
+
+So a range sweep needs one modtran run per (atmosphere, altitude)
+instead of one per range.  The spectra of all the ranges of the sweep
+spec are calculated at once, as arrays (nranges, nfreq), and written to
+<dir>/horizontal/<alt>/ranges.store (see tape7store.py), with the ranges
+in the meta data.
+
+modtran transmittances are band model averages over each spectral bin,
+which do not follow Beer-Lambert exactly for lines that are saturated
+within the bin, and the path is not quite homogeneous (e.g. refraction,
+a path through a boundary layer).  The expansion is therefore checked
+against direct runs at a few ranges, given in the spec:
+
+  {"kind": "horizontal", "geometries": [0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0],
+   "reference": 1.0, "check": [0.2, 10.0], ...}
+
+runSpec(spec) is the sweep of the reference and check runs, see
+domodtran-horizontal.py.  The check errors are the largest differences
+between the expanded and directly run spectra, relative to the largest
+value of the directly run spectrum.
+"""
+
+import os
+import numpy as np
+
+import stdatmos.instrument as instrument
+import stdatmos.sweep as sweep
+import stdatmos.tape7store as tape7store
+
+#path radiance, scaled with (1 - tau)
+pathColumns = ['PTH_THRML', 'THRML_SCT', 'SOL_SCAT', 'SING_SCAT']
+#radiance from the end of the path (surface), scaled with tau
+surfaceColumns = ['SURF_EMIS', 'GRND_RFLT', 'DRCT_RFLT']
+#tape7 columns read from the reference run
+tape7Columns = ['FREQ', 'DEPTH', 'TOTAL_RAD'] + pathColumns + surfaceColumns
+#columns compared with the direct runs
+checkColumns = ['TOT_TRANS', 'PTH_THRML', 'SOL_SCAT', 'TOTAL_RAD']
+#name of the range store in each altitude dir of the horizontal sweep
+rangeStoreName = 'ranges.store'
+
+###############################################################
+def runSpec(spec):
+  """Returns the sweep of the reference and check ranges of the range
+  sweep spec, sharded by atmosphere so that a shard has all the runs
+  for its atmospheres
+  """
+  refrange = referenceRange(spec)
+  ranges = [refrange] + [r for r in spec.get('check', []) if r != refrange]
+  return dict(spec, geometries=ranges, shardby='atmosphere')
+
+###############################################################
+def referenceRange(spec):
+  """Returns the reference range of the spec, default the first range
+  """
+  return spec.get('reference', spec['geometries'][0])
+
+###############################################################
+def sweepGroups(spec, shard=0, nshards=1):
+  """Returns the (atmosphere, altitude) of shard (0 to nshards-1), the
+  atmospheres dealt round robin to the shards as in runSpec
+  """
+  if spec['kind'] != 'horizontal' or spec['bands'] or 'cases' in spec:
+    raise ValueError('range expansion needs a horizontal sweep without bands or case list')
+  return [(atmo, alt) for atmo in spec['atmospheres'][shard::nshards] for alt in spec['altitudes']]
+
+###############################################################
+def rangeStore(atmosphere, altitude):
+  return os.path.join(os.path.dirname(sweep.caseDir('horizontal', atmosphere, altitude, 0.)),
+    rangeStoreName)
+
+###############################################################
+def rangeFactors(depth, ranges, refrange):
+  """Returns the transmittance, and the path radiance and surface radiance
+  factors, each (nranges, nfreq), for the reference optical depth (nfreq,)
+  """
+  ratio = np.asarray(ranges, dtype=np.float64).reshape(-1, 1) / refrange
+  tau = np.exp(-depth * ratio)
+  with np.errstate(invalid='ignore', divide='ignore'):
+    path = np.expm1(-depth * ratio) / np.expm1(-depth)
+  #(1 - tau) is linear in the range for a transparent path
+  path = np.where(depth > 0., path, ratio)
+  return tau, path, np.exp(-depth * (ratio - 1.))
+
+###############################################################
+def expandRanges(data, ranges, refrange):
+  """Returns the spectra (nranges, nfreq) for the ranges, as a dict by
+  column, from the reference run data (a dict of tape7Columns) at refrange
+  """
+  depth = data['DEPTH']
+  tau, path, surface = rangeFactors(depth, ranges, refrange)
+  ratio = np.asarray(ranges, dtype=np.float64).reshape(-1, 1) / refrange
+  spectra = {'FREQ':data['FREQ'], 'DEPTH':depth * ratio, 'TOT_TRANS':tau}
+  for column in pathColumns:
+    spectra[column] = data[column] * path
+  for column in surfaceColumns:
+    spectra[column] = data[column] * surface
+  surfacerad = np.sum([data[column] for column in surfaceColumns], axis=0)
+  spectra['TOTAL_RAD'] = (data['TOTAL_RAD'] - surfacerad) * path + surfacerad * surface
+  return spectra
+
+###############################################################
+def loadReference(datadir):
+  """Returns the tape7Columns of the run in datadir as a dict
+  """
+  return dict(zip(tape7Columns, tape7store.loadTape7(datadir, tape7Columns).T))
+
+###############################################################
+def checkErrors(data, refrange, datadir, checkrange):
+  """Returns the relative error of the expansion of the reference run data
+  to checkrange, against the run in datadir, for each of checkColumns
+  """
+  direct = tape7store.loadTape7(datadir, checkColumns)
+  expanded = expandRanges(data, [checkrange], refrange)
+  errors = {}
+  for i, column in enumerate(checkColumns):
+    scale = np.max(np.abs(direct[:, i]))
+    errors[column] = float(np.max(np.abs(expanded[column][0] - direct[:, i])) / scale) \
+      if scale > 0 else 0.
+  return errors
+
+###############################################################
+def expandSweep(spec, shard=0, nshards=1, stagelog=None):
+  """Expands the reference run of each (atmosphere, altitude) of the shard
+  to the ranges of the spec and writes them to the range stores, and
+  checks the expansion against the check runs.  Groups without a
+  reference run are skipped.  Returns a list of (atmosphere, altitude,
+  range, errors) for the check runs.
+  """
+  refrange = referenceRange(spec)
+  checks = []
+  for atmo, alt in sweepGroups(spec, shard, nshards):
+    refdir = sweep.caseDir('horizontal', atmo, alt, refrange)
+    if not os.path.exists(os.path.join(refdir, 'tape7')):
+      continue
+    with instrument.stage(stagelog, 'expand', refdir):
+      data = loadReference(refdir)
+      spectra = expandRanges(data, spec['geometries'], refrange)
+      tape7store.writeStore(rangeStore(atmo, alt), spectra, meta={'scenario':atmo,
+        'altitude':alt, 'ranges':list(spec['geometries']), 'reference':refrange})
+    for checkrange in spec.get('check', []):
+      checkdir = sweep.caseDir('horizontal', atmo, alt, checkrange)
+      if checkrange != refrange and os.path.exists(os.path.join(checkdir, 'tape7')):
+        checks.append((atmo, alt, checkrange, checkErrors(data, refrange, checkdir, checkrange)))
+  return checks
+
+###############################################################
+def readRanges(atmosphere, altitude, columns=None):
+  """Returns the ranges and the memory-mapped spectra (nranges, nfreq) of
+  the range store, as a dict by column (FREQ is (nfreq,))
+  """
+  storedir = rangeStore(atmosphere, altitude)
+  return tape7store.readMeta(storedir)['ranges'], tape7store.readStore(storedir, columns)
+
+###############################################################
+def printChecks(checks, tolerance=None):
+  """Prints the check errors, flagging those above tolerance
+  """
+  for atmo, alt, checkrange, errors in checks:
+    flag = '' if tolerance is None or max(errors.values()) <= tolerance else '  above tolerance'
+    print('{:24s} {:5.1f} km {:7.2f} km  '.format(atmo, alt, checkrange) +
+      '  '.join(['{} {:.2e}'.format(column, errors[column]) for column in checkColumns]) + flag)
@@ -0,0 +1,130 @@
+"""Cached resampling from the modtran wavenumber grid to a wavelength grid.
+
+All the tape7 files of a template have the same wavenumber grid, so the
+resampling from that grid to a wavelength grid is the same linear map
+for every spectrum.  It is calculated once as a sparse matrix (nwl x
+nfreq) and kept in a table, keyed by the wavenumber grid, the wavelength
+grid and the method, as the Planck tables in planck.py.  A batch of
+spectra (nspectra x nfreq) is then resampled in one sparse matrix
+product:
+
+  rs = resample.resampler(freq, 1500)
+  tau = rs.apply(spectra)     #(nspectra, 1500) at the wavelengths rs.wl
+
+The methods are
+ - linear interpolation in wavelength (two samples per output
+   wavelength, zero outside the grid), the same values as
+   scipy.interpolate.interp1d(1e4/freq, spectrum, fill_value=0.),
+ - conserve=True: the mean of the linearly interpolated spectrum over
+   the bin of each output wavelength (halfway to its neighbours), so
+   that the integral over wavelength of the resampled spectrum (bin
+   widths times values) is the integral of the spectrum.  Use this when
+   the output grid is coarser than the modtran grid and the band
+   integrals must be kept.
+
+A wavelength grid given as a number wlnum is wlnum samples on a linear
+wavelength scale over the wavenumber grid, the scale of domodtran.py.
+scipy is imported only to build a new matrix.
+"""
+
+import numpy as np
+
+import stdatmos.planck as planck
+
+#resamplers already calculated, keyed by (wavenumber grid, wavelength grid, conserve)
+resamplers = {}
+
+###############################################################
+class Resampler(object):
+  """Resampling matrix (nwl, nfreq) from the wavenumber grid freq (cm-1,
+  increasing) to the wavelengths wl (um, increasing).
+  """
+
+  def __init__(self, freq, wl, matrix, conserve=False):
+    self.freq = freq
+    self.wl = wl
+    self.matrix = matrix
+    self.conserve = conserve
+
+  def apply(self, spectra):
+    """Returns the spectra (..., nfreq) resampled to (..., nwl)
+    """
+    spectra = np.asarray(spectra, dtype=np.float64)
+    flat = spectra.reshape(-1, spectra.shape[-1])
+    out = np.ascontiguousarray(self.matrix.dot(flat.T).T)
+    return out.reshape(spectra.shape[:-1] + (self.wl.shape[0],))
+
+###############################################################
+def wavelengthGrid(freq, wlnum):
+  """Returns wlnum wavelengths (um) on a linear scale over the wavenumber grid
+  """
+  return np.linspace(1.0e4/freq[-1], 1.0e4/freq[0], wlnum)
+
+###############################################################
+def interpolationMatrix(freq, wl):
+  """Returns the entries (rows, columns, values) of the linear interpolation
+  matrix from freq to wl
+  """
+  nfreq = freq.shape[0]
+  #wavelength of the samples, increasing
+  wlsamples = 1.0e4 / freq[::-1]
+  idx = np.clip(np.searchsorted(wlsamples, wl, side='right') - 1, 0, nfreq - 2)
+  weight = (wl - wlsamples[idx]) / (wlsamples[idx+1] - wlsamples[idx])
+  inside = (wl >= wlsamples[0]) & (wl <= wlsamples[-1])
+  rows = np.tile(np.arange(wl.shape[0]), 2)
+  #columns in the (reversed) wavenumber order
+  columns = np.concatenate((nfreq - 1 - idx, nfreq - 2 - idx))
+  values = np.concatenate(((1. - weight) * inside, weight * inside))
+  return rows, columns, values
+
+###############################################################
+def averagingMatrix(freq, wl):
+  """Returns the entries (rows, columns, values) of the matrix that averages
+  the linearly interpolated spectrum on freq over the bins of wl, the bin
+  edges halfway between the wavelengths, clipped to the wavenumber grid
+  """
+  nfreq = freq.shape[0]
+  wlsamples = 1.0e4 / freq[::-1]
+  edges = np.concatenate(([1.5 * wl[0] - 0.5 * wl[1]], 0.5 * (wl[1:] + wl[:-1]),
+    [1.5 * wl[-1] - 0.5 * wl[-2]]))
+  edges = np.clip(edges, wlsamples[0], wlsamples[-1])
+  #pieces between the samples and bin edges, each in one segment and one bin
+  breaks = np.unique(np.concatenate((wlsamples, edges)))
+  start, stop = breaks[:-1], breaks[1:]
+  mid = 0.5 * (start + stop)
+  seg = np.clip(np.searchsorted(wlsamples, mid) - 1, 0, nfreq - 2)
+  wlbin = np.searchsorted(edges, mid) - 1
+  keep = (wlbin >= 0) & (wlbin < wl.shape[0])
+  start, stop, mid, seg, wlbin = start[keep], stop[keep], mid[keep], seg[keep], wlbin[keep]
+  #integral of the linear segment over the piece, as weights on its two samples
+  t = (mid - wlsamples[seg]) / (wlsamples[seg+1] - wlsamples[seg])
+  width = np.diff(edges)[wlbin]
+  scale = np.where(width > 0, (stop - start) / np.where(width > 0, width, 1.), 0.)
+  rows = np.concatenate((wlbin, wlbin))
+  columns = np.concatenate((nfreq - 1 - seg, nfreq - 2 - seg))
+  values = np.concatenate(((1. - t) * scale, t * scale))
+  return rows, columns, values
+
+###############################################################
+def resampler(freq, wl, conserve=False):
+  """Returns the Resampler from the wavenumber grid freq (cm-1, increasing)
+  to the wavelengths wl (um, increasing), or to wl samples on a linear
+  wavelength scale if wl is a number.  See the module docstring for conserve.
+  """
+  freq = np.ascontiguousarray(freq, dtype=np.float64)
+  if np.ndim(wl) == 0:
+    wlkey = int(wl)
+    wl = wavelengthGrid(freq, wlkey)
+  else:
+    wl = np.ascontiguousarray(wl, dtype=np.float64)
+    wlkey = planck.gridKey(wl)
+  key = (planck.gridKey(freq), wlkey, bool(conserve))
+  if key not in resamplers:
+    import scipy.sparse as sparse
+    if wl.shape[0] < 2 and conserve:
+      raise ValueError('conserve needs at least two wavelengths')
+    rows, columns, values = (averagingMatrix if conserve else interpolationMatrix)(freq, wl)
+    matrix = sparse.csr_matrix((values, (rows, columns)), shape=(wl.shape[0], freq.shape[0]))
+    matrix.eliminate_zeros()
+    resamplers[key] = Resampler(freq, wl, matrix, conserve)
+  return resamplers[key]
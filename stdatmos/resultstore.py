@@ -0,0 +1,150 @@
+"""Append-only store for the wideband results of the elevation sweep.
+
+The results are rows of (Atmo, Altitude, Zenith, SpecBand) plus the
+integrated quantities (ToaWattTot ... effTau300).  They are appended in
+batches to a SQLite table, with (Atmo, Altitude, Zenith, SpecBand) as
+primary key.  Rows that are already in the store are skipped, so a sweep
+can be rerun or extended without duplicating rows, and without reading
+and rewriting all the earlier results.
+
+The spreadsheet (atmos-elevation-angles.xlsx) is written from the store
+as the last step of the sweep, see exportExcel.  The rows are streamed
+from the database to the spreadsheet (or csv file) in constant memory,
+see export.py.
+
+The adaptive elevation sweep (see adaptive.py) runs modtran on part of
+the zenith grid only, and interpolates the other zenith angles into a
+second table of the same database, e.g. ResultStore(dbfile, columns,
+'surrogate').  The exports fill the zenith angles missing in the results
+with the rows of that table, exportExcel(xlsxfile, fill='surrogate').
+"""
+
+import sqlite3
+
+keyColumns = ['Atmo', 'Altitude', 'Zenith', 'SpecBand']
+
+###############################################################
+class ResultStore(object):
+  """SQLite store of the wideband results in dbfile, in table.
+  columns are the integrated quantities, new columns are added to an
+  existing store.
+  """
+
+  def __init__(self, dbfile, columns, table='results'):
+    self.dbfile = dbfile
+    self.columns = list(columns)
+    self.table = table
+    self.conn = sqlite3.connect(dbfile)
+    self.conn.execute('CREATE TABLE IF NOT EXISTS {} (Atmo TEXT, Altitude REAL, '
+      'Zenith REAL, SpecBand TEXT, PRIMARY KEY (Atmo, Altitude, Zenith, SpecBand))'.format(table))
+    self.conn.execute('CREATE TABLE IF NOT EXISTS specranges '
+      '(SpecBand TEXT PRIMARY KEY, Start REAL, End REAL)')
+    existing = self.allColumns()
+    for column in self.columns:
+      if column not in existing:
+        self.conn.execute('ALTER TABLE {} ADD COLUMN "{}" REAL'.format(table, column))
+    self.conn.commit()
+
+  def close(self):
+    self.conn.close()
+
+  def writeSpecRanges(self, specranges):
+    """Stores the spectral ranges, specranges[key] = [start um, end um]
+    """
+    self.conn.executemany('INSERT OR REPLACE INTO specranges VALUES (?, ?, ?)',
+      [(key, float(specranges[key][0]), float(specranges[key][1])) for key in specranges])
+    self.conn.commit()
+
+  def appendRows(self, rows):
+    """Appends rows [Atmo, Altitude, Zenith, SpecBand, quantities...] in one
+    transaction, rows with a key already in the store are skipped.
+    Returns the number of rows added.
+    """
+    allcolumns = keyColumns + self.columns
+    sql = 'INSERT OR IGNORE INTO {} ({}) VALUES ({})'.format(self.table,
+      ', '.join(['"{}"'.format(col) for col in allcolumns]), ', '.join(['?'] * len(allcolumns)))
+    before = self.conn.total_changes
+    self.conn.executemany(sql, [[str(row[0]), float(row[1]), float(row[2]), str(row[3])]
+      + [float(value) for value in row[4:]] for row in rows])
+    self.conn.commit()
+    return self.conn.total_changes - before
+
+  def existingKeys(self, atmo, altitude):
+    """Returns the set of (Zenith, SpecBand) stored for atmo and altitude
+    """
+    return set(self.conn.execute('SELECT Zenith, SpecBand FROM {} '
+      'WHERE Atmo = ? AND Altitude = ?'.format(self.table), (atmo, float(altitude))).fetchall())
+
+  def readGroup(self, atmo, altitude):
+    """Returns the rows (all columns) stored for atmo and altitude,
+    ordered by Zenith and SpecBand
+    """
+    return self.conn.execute('SELECT * FROM {} WHERE Atmo = ? AND Altitude = ? '
+      'ORDER BY Zenith, SpecBand'.format(self.table), (atmo, float(altitude))).fetchall()
+
+  def deleteGroup(self, atmo, altitude):
+    """Deletes the rows stored for atmo and altitude
+    """
+    self.conn.execute('DELETE FROM {} WHERE Atmo = ? AND Altitude = ?'.format(self.table),
+      (atmo, float(altitude)))
+    self.conn.commit()
+
+  def numRows(self):
+    return self.conn.execute('SELECT COUNT(*) FROM {}'.format(self.table)).fetchone()[0]
+
+  def selectSQL(self, fill=None):
+    """Returns the query of all the rows ordered by key, with the rows of
+    the table fill (same columns) for the keys missing in this table
+    """
+    columns = ', '.join(['"{}"'.format(col) for col in self.allColumns()])
+    sql = 'SELECT {} FROM {}'.format(columns, self.table)
+    if fill is not None:
+      keys = ', '.join(keyColumns)
+      sql += ' UNION ALL SELECT {} FROM {} WHERE ({}) NOT IN (SELECT {} FROM {})'.format(
+        columns, fill, keys, keys, self.table)
+    return sql + ' ORDER BY Atmo, Altitude, Zenith, SpecBand'
+
+  def readFrame(self, fill=None):
+    """Returns the results as a pandas DataFrame, ordered by key, see selectSQL
+    """
+    import pandas as pd
+    return pd.read_sql_query(self.selectSQL(fill), self.conn)
+
+  def readSpecRanges(self):
+    """Returns the spectral ranges as a dict, specranges[key] = [start um, end um]
+    """
+    return dict([(row[0], [row[1], row[2]]) for row in
+      self.conn.execute('SELECT SpecBand, Start, End FROM specranges')])
+
+  def iterRows(self, fill=None):
+    """Yields the result rows ordered by key, read from the database as
+    needed, see selectSQL
+    """
+    cursor = self.conn.execute(self.selectSQL(fill))
+    while True:
+      rows = cursor.fetchmany(1000)
+      if not rows:
+        break
+      for row in rows:
+        yield row
+
+  def allColumns(self):
+    return [row[1] for row in self.conn.execute('PRAGMA table_info({})'.format(self.table))]
+
+  def exportExcel(self, xlsxfile, fill=None):
+    """Writes the results to Sheet1 and the spectral ranges to SpecRanges,
+    the missing keys filled from the table fill.  Sheet1 starts with a
+    row number column, as the DataFrame index written by pandas did.
+    """
+    import stdatmos.export as export
+    specranges = self.readSpecRanges()
+    keys = list(specranges.keys())
+    rows = ([i] + list(row) for i, row in enumerate(self.iterRows(fill)))
+    export.writeRowsXLSX(xlsxfile, [('Sheet1', [None] + self.allColumns(), rows),
+      ('SpecRanges', [None] + keys, [[i] + [specranges[key][i] for key in keys] for i in range(2)])])
+
+  def exportCSV(self, csvfile, fill=None):
+    """Writes the results to a csv file, the missing keys filled from the table fill
+    """
+    import stdatmos.export as export
+    export.writeRowsCSV(csvfile, self.allColumns(), self.iterRows(fill))
@@ -0,0 +1,233 @@
+"""Runs modtran on a single tape5 and waits for it to complete.
+
+The run is done in its own scratch directory, with the entries of the
+modtran bin directory (DATA etc.) linked in, see scheduler.py.
+The process is started without a shell and its exit is awaited with
+asyncio, there is no poll/sleep loop.  Each run has an optional timeout
+in seconds, after which modtran is killed.
+
+The modtran stdout and stderr are written next to the tape6 in the case
+directory, as modtran.stdout and modtran.stderr.
+
+runModtran() runs a single case, runModtranCases() runs several cases
+concurrently in one process.  Both return RunResult tuples with the
+wall time per case.
+
+If a cache.ResultCache is given, a case with the same tape5 text and
+executable as an earlier run is not run again, the stored tape6/tape7
+are used instead (RunResult.cached is True).
+"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+
+import stdatmos.cache as cache
+
+#files written by modtran, these are not linked into the scratch dirs
+modtranOutputs = ['tape5', 'tape6', 'tape7', 'tape7.scn', 'tape8', 'tape9']
+
+#usage is the resources used by the job, see instrument.usageDelta
+RunResult = namedtuple('RunResult', ['datadir', 'returncode', 'walltime', 'timedout', 'cached',
+  'usage'], defaults=[False, None])
+
+###############################################################
+def modtranCommand(modtranexe):
+  """Returns the modtran command as a list, from a filename or a list
+  """
+  if isinstance(modtranexe, (list, tuple)):
+    return list(modtranexe)
+  return [modtranexe]
+
+###############################################################
+def linkDirectory(src, dst):
+  """Links the directory src as dst: a symbolic link, or a directory
+  junction on windows without the symlink privilege.  The directory is
+  copied only if neither can be made.
+  """
+  try:
+    os.symlink(src, dst, target_is_directory=True)
+    return
+  except (OSError, NotImplementedError):
+    pass
+  try:
+    import _winapi
+    _winapi.CreateJunction(os.path.abspath(src), dst)
+  except (ImportError, OSError):
+    shutil.copytree(src, dst)
+
+###############################################################
+def linkFile(src, dst):
+  """Links the file src as dst: a symbolic link, or a hard link on windows
+  without the symlink privilege.  The file is copied only if neither can
+  be made, e.g. when the scratch directory is on another volume.
+  """
+  try:
+    os.symlink(src, dst)
+    return
+  except (OSError, NotImplementedError):
+    pass
+  try:
+    os.link(src, dst)
+  except OSError:
+    shutil.copy2(src, dst)
+
+###############################################################
+def linkModtranData(modtranbin, scratchdir):
+  """Links the entries in the modtran bin directory into scratchdir, so
+  that the DATA directory is shared by all the runs, not copied per run
+  """
+  if modtranbin is None:
+    return
+  for name in os.listdir(modtranbin):
+    if name.lower() in modtranOutputs:
+      continue
+    src = os.path.join(modtranbin, name)
+    dst = os.path.join(scratchdir, name)
+    if os.path.isdir(src):
+      linkDirectory(src, dst)
+    else:
+      linkFile(src, dst)
+
+###############################################################
+def fetchCached(datadir, key, resultcache):
+  """Fetches the tape6/tape7 for key from resultcache into datadir.
+  Returns True if found.  The key of the last result written to datadir
+  is kept in datadir/modtran.key, so a result already in place is not
+  copied again.
+  """
+  keyfile = os.path.join(datadir, 'modtran.key')
+  if os.path.exists(keyfile) and os.path.exists(os.path.join(datadir, 'tape7')):
+    with open(keyfile) as fin:
+      if fin.read().strip() == key:
+        return True
+  if resultcache.fetch(key, datadir):
+    writeKey(datadir, key)
+    return True
+  return False
+
+###############################################################
+def writeKey(datadir, key):
+  """Writes the key of the result in datadir to datadir/modtran.key
+  """
+  with open(os.path.join(datadir, 'modtran.key'), 'wt') as fout:
+    fout.write(key + '\n')
+
+###############################################################
+async def runModtranAsync(datadir, modtranexe, modtranbin=None, timeout=None,
+                          scratchroot=None, resultcache=None):
+  """Runs modtran on datadir/tape5 in a new scratch directory.
+  The tape6, tape7, stdout and stderr files are written to datadir.
+  Returns a RunResult, returncode is None if the run timed out, -1 if
+  modtran could not be started (the error is in modtran.stderr).
+  """
+  if resultcache is not None:
+    key = cache.caseKey(os.path.join(datadir, 'tape5'), modtranexe)
+    if fetchCached(datadir, key, resultcache):
+      return RunResult(datadir, 0, 0., False, True)
+    #the result in datadir is replaced below
+    if os.path.exists(os.path.join(datadir, 'modtran.key')):
+      os.remove(os.path.join(datadir, 'modtran.key'))
+
+  scratchdir = tempfile.mkdtemp(prefix='modtran-', dir=scratchroot)
+  try:
+    linkModtranData(modtranbin, scratchdir)
+    shutil.copy2(os.path.join(datadir, 'tape5'), scratchdir)
+
+    timedout = False
+    t0 = time.perf_counter()
+    try:
+      proc = await asyncio.create_subprocess_exec(*modtranCommand(modtranexe),
+        cwd=scratchdir, stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    except OSError as error:
+      #e.g. a missing or not executable modtran
+      return failedResult(datadir, error)
+    try:
+      stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+      timedout = True
+      proc.kill()
+      stdout, stderr = await proc.communicate()
+    walltime = time.perf_counter() - t0
+
+    with open(os.path.join(datadir, 'modtran.stdout'), 'wb') as fout:
+      fout.write(stdout)
+    with open(os.path.join(datadir, 'modtran.stderr'), 'wb') as fout:
+      fout.write(stderr)
+
+    #copy the tape6/7 files back to appropriate directory,
+    #removing results from earlier runs if this run timed out
+    for name in ['tape6', 'tape7']:
+      filename = os.path.join(scratchdir, name)
+      if not timedout and os.path.exists(filename):
+        shutil.copy2(filename, datadir)
+      elif os.path.exists(os.path.join(datadir, name)):
+        os.remove(os.path.join(datadir, name))
+  finally:
+    shutil.rmtree(scratchdir, ignore_errors=True)
+
+  if resultcache is not None and not timedout and proc.returncode == 0 \
+      and os.path.exists(os.path.join(datadir, 'tape7')):
+    resultcache.store(key, datadir)
+    writeKey(datadir, key)
+
+  return RunResult(datadir, None if timedout else proc.returncode, walltime, timedout)
+
+###############################################################
+def runModtran(datadir, modtranexe, modtranbin=None, timeout=None, scratchroot=None,
+               resultcache=None):
+  """Runs modtran on datadir/tape5, see runModtranAsync.
+  """
+  return asyncio.run(runModtranAsync(datadir, modtranexe, modtranbin, timeout,
+    scratchroot, resultcache))
+
+###############################################################
+def runModtranCases(datadirs, modtranexe, modtranbin=None, timeout=None,
+                    maxjobs=None, scratchroot=None, resultcache=None):
+  """Runs modtran on the tape5 files in datadirs, maxjobs at a time,
+  in the current process.  Returns a list of RunResult in datadirs order.
+  """
+  if maxjobs is None:
+    maxjobs = os.cpu_count() or 1
+
+  async def runAll():
+    semaphore = asyncio.Semaphore(maxjobs)
+    async def runOne(datadir):
+      async with semaphore:
+        return await runModtranAsync(datadir, modtranexe, modtranbin, timeout,
+          scratchroot, resultcache)
+    return await asyncio.gather(*[runOne(datadir) for datadir in datadirs])
+
+  return asyncio.run(runAll())
+
+###############################################################
+def failedResult(datadir, error):
+  """Writes the error to datadir/modtran.stderr and returns a RunResult
+  for a run that failed without a modtran return code.  The error is
+  printed instead if datadir cannot be written, e.g. does not exist.
+  """
+  message = '{}: {}\n'.format(type(error).__name__, error)
+  try:
+    with open(os.path.join(datadir, 'modtran.stderr'), 'wt') as fout:
+      fout.write(message)
+  except OSError:
+    print('{} {}'.format(datadir, message), end='')
+  return RunResult(datadir, -1, 0., False)
+
+###############################################################
+def reportResult(result):
+  """Prints the wall time and status of a run
+  """
+  if result.cached:
+    status = 'cached'
+  elif result.timedout:
+    status = 'timed out'
+  elif result.returncode != 0:
+    status = 'failed, return code {}'.format(result.returncode)
+  else:
+    status = 'ok'
+  print('{} {:.2f} s {}'.format(result.datadir, result.walltime, status))
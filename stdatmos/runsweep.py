@@ -0,0 +1,100 @@
+"""Entry points for the tape5-generation and run-only stages of a sweep.
+
+On a cluster each shard of a sweep is started in a fresh interpreter,
+so the time to import the sweep code is paid by every job.  These entry
+points import only the sweep spec, the tape5 card model and (to run)
+the scheduler, not numpy, scipy, pandas, xlsxwriter or pyradi:
+
+  python -m stdatmos.runsweep sweeps/elevation.json --tape5 [--shard i N]
+  python -m stdatmos.runsweep sweeps/elevation.json --run <modtranexe> --bin <dir> [--shard i N]
+
+--tape5 writes the tape5 files of shard i of N.  --run also runs modtran
+on them (use --run stub for stubmodtran) and keeps the tape6/tape7 files
+in the case directories; the completed cases are kept in the sweep ledger
+and skipped when the shard is run again.  The tape7 files are processed
+later, e.g. with pipeline.integrateExisting.
+
+The startup time of these entry points is checked against a budget by
+python -m benchmarks.benchstartup.
+"""
+
+import stdatmos.instrument as instrument
+import stdatmos.sweep as sweep
+
+###############################################################
+def writeCases(spec, shard=0, nshards=1, skip=None, stagelog=None):
+  """Writes the tape5 files of the cases of a shard, see sweep.iterCases.
+  Yields the case directory as each tape5 is written.
+  """
+  for case in sweep.iterCases(spec, shard, nshards, skip):
+    with instrument.stage(stagelog, 'tape5') as record:
+      record['case'] = sweep.writeCase(spec, case)
+    yield record['case']
+
+###############################################################
+def runSweep(spec, modtranexe, modtranbin=None, shard=0, nshards=1, nproc=None,
+             timeout=None, resultcache=None, stagelog=None):
+  """Writes the tape5 files of a shard and runs modtran on them, see
+  scheduler.iterJobs.  The cases in the shard ledger are skipped and the
+  completed cases are added to it.  Returns the number of failed runs.
+  """
+  import stdatmos.runner as runner
+  import stdatmos.scheduler as scheduler
+  ledger = sweep.Ledger(sweep.ledgerFile(spec, shard, nshards))
+  skip = lambda case: ledger.isDone(sweep.specCaseDir(spec, case))
+  nfailed = 0
+  try:
+    for result in scheduler.iterJobs(writeCases(spec, shard, nshards, skip, stagelog),
+                                     modtranexe, modtranbin, nproc, timeout, resultcache=resultcache):
+      runner.reportResult(result)
+      if stagelog is not None:
+        stagelog.writeResult(result)
+      if result.returncode == 0:
+        ledger.markDone(result.datadir)
+      else:
+        nfailed += 1
+  finally:
+    ledger.close()
+  return nfailed
+
+##########################################################################################################
+if __name__ == '__main__':
+  import argparse
+  parser = argparse.ArgumentParser(description='Writes the tape5 files of a sweep shard, '
+    'or writes and runs them')
+  parser.add_argument('spec', help='sweep spec file, see stdatmos/sweep.py')
+  parser.add_argument('--shard', nargs=2, type=int, default=[0, 1], metavar=('I', 'N'),
+    help='run shard I of N')
+  mode = parser.add_mutually_exclusive_group(required=True)
+  mode.add_argument('--tape5', action='store_true', help='write the tape5 files only')
+  mode.add_argument('--run', metavar='MODTRANEXE', help='modtran executable, or stub')
+  parser.add_argument('--bin', default=None, help='modtran bin directory')
+  parser.add_argument('--nproc', type=int, default=None)
+  parser.add_argument('--timeout', type=float, default=3600., help='seconds per run')
+  parser.add_argument('--cache', default=None, help='result cache directory')
+  parser.add_argument('--stagelog', default=None, help='stage log file')
+  args = parser.parse_args()
+
+  spec = sweep.readSpec(args.spec)
+  shard, nshards = args.shard
+  stagelog = None if args.stagelog is None else instrument.StageLog(args.stagelog)
+  if args.tape5:
+    ncases = len(list(writeCases(spec, shard, nshards, stagelog=stagelog)))
+    print('{} tape5 files written for shard {} of {}'.format(ncases, shard, nshards))
+    nfailed = 0
+  else:
+    modtranexe = args.run
+    if modtranexe == 'stub':
+      import stdatmos.stubmodtran as stubmodtran
+      modtranexe = stubmodtran.stubCommand()
+    resultcache = None
+    if args.cache is not None:
+      import stdatmos.cache as cache
+      resultcache = cache.ResultCache(args.cache)
+    nfailed = runSweep(spec, modtranexe, args.bin, shard, nshards, args.nproc,
+      args.timeout, resultcache, stagelog)
+  if stagelog is not None:
+    stagelog.close()
+    instrument.printSummary(instrument.summarise(instrument.readLog(args.stagelog)))
+  if nfailed:
+    raise SystemExit('{} modtran runs failed'.format(nfailed))
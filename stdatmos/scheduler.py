@@ -0,0 +1,102 @@
+"""Runs modtran on many tape5 files at the same time.
+
+Modtran reads tape5 and writes tape6/tape7 in its current working directory.
+Running all cases in the one modtran bin directory forces the cases to run
+one after another.  Here each case (job) gets its own scratch directory,
+with the entries of the modtran bin directory (DATA etc.) linked in.
+The tape5 is copied into the scratch directory, modtran is run there and
+the tape6/tape7 files are copied back to the case directory, e.g.
+<dir>/elev/<alt>/<elev>.  The single case run is done in runner.py.
+
+The jobs are run on a process pool, sized to the number of cores.
+The resources used by each job (wall and cpu time, peak memory, bytes
+copied) are measured in the worker, see instrument.py.
+
+The modtran executable can be a filename or a command list, so that the
+stub in stubmodtran.py can stand in for modtran:
+
+  import stdatmos.stubmodtran as stubmodtran
+  runJobs(datadirs, stubmodtran.stubCommand(), modtranbin=None)
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import stdatmos.instrument as instrument
+import stdatmos.runner as runner
+
+###############################################################
+def runJob(datadir, modtranexe, modtranbin=None, timeout=None, scratchroot=None,
+           resultcache=None):
+  """Runs modtran on datadir/tape5 in a new scratch directory.
+  The tape6 and tape7 files are copied back to datadir.
+  Returns a runner.RunResult, with the resources used by the job.
+  """
+  before = instrument.resourceUsage()
+  result = runner.runModtran(datadir, modtranexe, modtranbin, timeout, scratchroot,
+    resultcache)
+  return result._replace(usage=instrument.usageDelta(before, instrument.resourceUsage()))
+
+###############################################################
+def iterJobs(datadirs, modtranexe, modtranbin=None, nproc=None, timeout=None,
+             scratchroot=None, resultcache=None):
+  """Runs modtran on the tape5 files in datadirs, nproc jobs at a time.
+  Yields runner.RunResult as the jobs complete, not in input order.
+  nproc defaults to the number of cores, timeout is per job in seconds.
+  Cases found in resultcache (a cache.ResultCache) are not run again.
+  A job that raises an exception, or cannot be submitted because the
+  pool is broken (e.g. a worker was killed), is yielded as a failed run
+  (returncode -1, the error in datadir/modtran.stderr if it can be
+  written), the other jobs carry on.
+  datadirs can be a generator, it is read as jobs are submitted, with
+  at most 2 * nproc jobs waiting.
+  """
+  if nproc is None:
+    nproc = os.cpu_count() or 1
+  datadirs = iter(datadirs)
+  with ProcessPoolExecutor(max_workers=nproc) as executor:
+    pending = {}
+    while True:
+      #keep the workers busy, the datadirs are read only as needed
+      for datadir in datadirs:
+        try:
+          pending[executor.submit(runJob, datadir, modtranexe, modtranbin, timeout,
+            scratchroot, resultcache)] = datadir
+        except Exception as error:
+          #a broken pool fails the remaining jobs as they are submitted
+          yield runner.failedResult(datadir, error)
+          continue
+        if len(pending) >= 2 * nproc:
+          break
+      if not pending:
+        break
+      done = wait(pending, return_when=FIRST_COMPLETED).done
+      for future in done:
+        datadir = pending.pop(future)
+        try:
+          result = future.result()
+        except Exception as error:
+          result = runner.failedResult(datadir, error)
+        yield result
+
+###############################################################
+def runJobs(datadirs, modtranexe, modtranbin=None, nproc=None, timeout=None,
+            scratchroot=None, resultcache=None, stagelog=None):
+  """Runs modtran on the tape5 files in datadirs, nproc jobs at a time.
+  The wall time of each job is printed as it completes, and written to
+  stagelog (an instrument.StageLog) if given.
+  Returns a list of runner.RunResult in the order of datadirs.
+  """
+  results = {}
+  order = []
+  def submitted():
+    for datadir in datadirs:
+      order.append(datadir)
+      yield datadir
+  for result in iterJobs(submitted(), modtranexe, modtranbin, nproc, timeout,
+                         scratchroot, resultcache):
+    runner.reportResult(result)
+    if stagelog is not None:
+      stagelog.writeResult(result)
+    results[result.datadir] = result
+  return [results[datadir] for datadir in order]
@@ -0,0 +1,132 @@
+"""Stub that stands in for the modtran executable, for testing on Linux.
+
+Reads tape5 in the current working directory and writes tape6 and a
+tape7 with the same layout as a modtran 5 radiance run (IEMSCT=2): the
+tape5 cards, a column header line and the spectral data, terminated by
+-9999.  The spectra are synthetic, but depend on the path geometry
+(H1, ANGLE, or RANGE for a horizontal path) and the spectral range (V1,
+V2, DV) in the tape5.
+
+Run as
+  python stubmodtran.py [delay in seconds]
+or use stubCommand() to get the command list for the scheduler.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+tape7Columns = ['FREQ', 'TOT_TRANS', 'PTH_THRML', 'THRML_SCT', 'SURF_EMIS',
+  'SOL_SCAT', 'SING_SCAT', 'GRND_RFLT', 'DRCT_RFLT', 'TOTAL_RAD', 'REF_SOL',
+  'SOL@OBS', 'DEPTH', 'DIR_EM', 'TOA_SUN', 'BBODY_T[K]']
+
+###############################################################
+def stubCommand(delay=0.):
+  """Returns the command list to run the stub in place of modtran
+  """
+  cmd = [sys.executable, os.path.abspath(__file__)]
+  if delay > 0:
+    cmd.append('{}'.format(delay))
+  return cmd
+
+###############################################################
+def cardIndices(lines):
+  """Returns the line indices of CARD3 and CARD4 in the tape5 lines
+  """
+  model = int(lines[0][3:5])
+  iemsct = int(lines[0][10:15])
+  icard3 = 3
+  if model in [7, 8]:
+    #skip card 2C and the profile levels, each with optional 2C2/2C3 lines
+    ml, ird1, ird2 = [int(lines[3][i:i+5]) for i in [0, 5, 10]]
+    icard3 = 4 + ml * (1 + ird1 + ird2)
+  icard4 = icard3 + (3 if iemsct == 2 else 1)
+  return icard3, icard4
+
+###############################################################
+def readGeometry(lines):
+  """Returns (H1, ANGLE, V1, V2, DV) from the tape5 lines
+  """
+  icard3, icard4 = cardIndices(lines)
+  h1 = float(lines[icard3][0:10])
+  angle = float(lines[icard3][20:30])
+  v1, v2, dv = [float(lines[icard4][i:i+10]) for i in [0, 10, 20]]
+  return h1, angle, v1, v2, dv
+
+###############################################################
+def readPath(lines):
+  """Returns (ITYPE, RANGE) from the tape5 lines
+  """
+  icard3, icard4 = cardIndices(lines)
+  return int(lines[0][6:10]), float(lines[icard3][30:40])
+
+###############################################################
+def planckWn(freq, temp):
+  """Planck radiance in W/(cm2.sr.cm-1), freq in cm-1
+  """
+  return 1.191042e-12 * freq ** 3 / (np.exp(1.4387769 * freq / temp) - 1.)
+
+###############################################################
+def stubSpectra(h1, angle, v1, v2, dv, pathrange=None):
+  """Returns the synthetic tape7 data array, one column per tape7Columns.
+  pathrange (km) is given for a horizontal path.
+  """
+  freq = np.arange(v1, v2 + dv / 2., dv)
+  #air mass along the path, limited near and below the horizon, or of a
+  #horizontal path relative to the vertical column (8 km scale height)
+  if pathrange is None:
+    airmass = 1. / max(np.abs(np.cos(np.radians(angle))), 0.05)
+  else:
+    airmass = pathrange / 8.
+  airmass *= np.exp(-h1 / 8.)
+  #molecular bands (water, CO2) on a scattering continuum
+  depth = 0.02 + 1e-10 * freq ** 2
+  for centre, width, strength in [(1595., 150., 3.), (2350., 40., 8.),
+                                  (3750., 120., 2.), (5330., 150., 1.)]:
+    depth += strength * np.exp(-0.5 * ((freq - centre) / width) ** 2)
+  depth *= airmass
+  trans = np.exp(-depth)
+  toasun = 6.8e-5 * planckWn(freq, 5800.)
+  pthrml = (1. - trans) * planckWn(freq, 260.)
+  solscat = 0.05 * (1. - trans) * toasun
+  totalrad = pthrml + solscat
+
+  data = np.zeros((freq.shape[0], len(tape7Columns)))
+  data[:, tape7Columns.index('FREQ')] = freq
+  data[:, tape7Columns.index('TOT_TRANS')] = trans
+  data[:, tape7Columns.index('PTH_THRML')] = pthrml
+  data[:, tape7Columns.index('SOL_SCAT')] = solscat
+  data[:, tape7Columns.index('SING_SCAT')] = solscat
+  data[:, tape7Columns.index('TOTAL_RAD')] = totalrad
+  data[:, tape7Columns.index('SOL@OBS')] = toasun * trans
+  data[:, tape7Columns.index('DEPTH')] = depth
+  data[:, tape7Columns.index('TOA_SUN')] = toasun
+  data[:, tape7Columns.index('BBODY_T[K]')] = 260.
+  return data
+
+###############################################################
+def runStub(workdir='.'):
+  """Reads tape5 in workdir and writes tape6 and tape7
+  """
+  with open(os.path.join(workdir, 'tape5')) as fin:
+    lines = fin.readlines()
+  h1, angle, v1, v2, dv = readGeometry(lines)
+  itype, pathrange = readPath(lines)
+  data = stubSpectra(h1, angle, v1, v2, dv, pathrange if itype == 1 else None)
+
+  with open(os.path.join(workdir, 'tape6'), 'wt') as fout:
+    fout.write(' stub modtran\n H1 {} km, ANGLE {} deg, V1 {} V2 {} DV {}\n'.format(
+      h1, angle, v1, v2, dv))
+
+  with open(os.path.join(workdir, 'tape7'), 'wt') as fout:
+    fout.writelines(lines)
+    fout.write(' '.join(['{:>10s}'.format(col) for col in tape7Columns]) + '\n')
+    np.savetxt(fout, data, fmt='%10.4e')
+    fout.write(' -9999.\n')
+
+##########################################################################################################
+if __name__ == '__main__':
+  if len(sys.argv) > 1:
+    time.sleep(float(sys.argv[1]))
+  runStub()
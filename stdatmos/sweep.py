@@ -0,0 +1,236 @@
+"""Sweep definitions: the cases of a sweep from a JSON spec file.
+
+A sweep is the product atmosphere x altitude x geometry x spectral band,
+or an explicit (sparse) list of cases.  The spec files are in sweeps/:
+
+  {
+   "name": "elevation",
+   "kind": "elev",
+   "atmospheres": ["TropicalRural", "TropicalUrban"],
+   "altitudes": [0, 30000],
+   "geometries": {"linspace": [[0, 70, 15], [72, 80, 9]]},
+   "bands": [{"name": "MWIR", "V1": 2000, "V2": 2800, "DV": 1}],
+   "shardby": "case"
+  }
+
+ - kind: '1km' (domodtran.py, <atmo>/<alt>, no geometry), 'elev' (zenith
+   angle in deg, <atmo>/elev/<alt>/<angle>) or 'horizontal' (range in km,
+   <atmo>/horizontal/<alt>/<range>),
+ - altitudes: in m for '1km' and 'elev', in km for 'horizontal',
+ - altitudes and geometries are lists or {"linspace": [[start, stop, num], ...]},
+   the segments are joined and repeated values dropped,
+ - bands (optional): modtran spectral ranges (CARD4 V1, V2, DV), the
+   template range is used if there are none.  With bands, the sweep
+   directory is named <kind>-<band name>, e.g. <atmo>/elev-MWIR/<alt>/<angle>,
+ - cases (optional): a list of [atmosphere, altitude, geometry(, band name)]
+   to run instead of the full product,
+ - shardby: 'case' (default) or 'atmosphere', the unit handed to a shard.
+ - reference, check (optional, 'horizontal'): the range run for the range
+   expansion and the ranges run to check it, see rangesweep.py.
+
+The cases are generated lazily, one at a time, so the product is never
+built in memory.  A sweep can be split over machines by running shard i
+of N on each, and restarted after a crash by skipping the cases that
+are done, see iterCases and Ledger:
+
+  spec = sweep.readSpec('sweeps/elevation.json')
+  ledger = sweep.Ledger(sweep.ledgerFile(spec, shard, nshards))
+  skip = lambda case: ledger.isDone(sweep.specCaseDir(spec, case))
+  for case in sweep.iterCases(spec, shard, nshards, skip):
+    ...
+
+python -m stdatmos.sweep sweeps/elevation.json [shard nshards] lists the cases.
+"""
+
+import itertools
+import json
+import os
+from collections import namedtuple
+
+import stdatmos.tape5 as tape5
+
+sweepKinds = ['1km', 'elev', 'horizontal']
+
+Case = namedtuple('Case', ['index', 'atmosphere', 'altitude', 'geometry', 'band'])
+
+###############################################################
+def linspace(start, stop, num):
+  """Returns num values from start to stop, the same values as
+  numpy.linspace, without importing numpy to read a spec
+  """
+  if num == 1:
+    return [float(start)]
+  step = (stop - start) / float(num - 1)
+  values = [i * step + start for i in range(num)]
+  values[-1] = float(stop)
+  return values
+
+###############################################################
+def axisValues(values):
+  """Returns the values of an axis given as a list or as linspace segments,
+  with repeated values dropped
+  """
+  if isinstance(values, dict):
+    values = [value for segment in values['linspace'] for value in linspace(*segment)]
+  axis = []
+  for value in values:
+    if value not in axis:
+      axis.append(value)
+  return axis
+
+###############################################################
+def readSpec(filename):
+  """Reads the sweep spec in the JSON file, returns it as a dict with the
+  axes expanded, see the module docstring
+  """
+  with open(filename, 'rt') as fin:
+    spec = json.load(fin)
+  if spec.get('kind') not in sweepKinds:
+    raise ValueError('{}: kind must be one of {}'.format(filename, sweepKinds))
+  spec.setdefault('name', os.path.splitext(os.path.basename(filename))[0])
+  spec['altitudes'] = axisValues(spec['altitudes'])
+  spec['geometries'] = [None] if spec['kind'] == '1km' else axisValues(spec['geometries'])
+  spec.setdefault('bands', [])
+  spec.setdefault('shardby', 'case')
+  if spec['shardby'] not in ['case', 'atmosphere']:
+    raise ValueError('{}: shardby must be case or atmosphere'.format(filename))
+  return spec
+
+###############################################################
+def allCases(spec):
+  """Yields the cases of the spec, not sharded
+  """
+  bands = dict([(band['name'], band) for band in spec['bands']])
+  if 'cases' in spec:
+    for index, case in enumerate(spec['cases']):
+      band = bands[case[3]] if len(case) > 3 else None
+      yield Case(index, case[0], case[1], case[2] if len(case) > 2 else None, band)
+  else:
+    product = itertools.product(spec['atmospheres'], spec['altitudes'], spec['geometries'],
+      spec['bands'] if spec['bands'] else [None])
+    for index, (atmo, alt, geom, band) in enumerate(product):
+      yield Case(index, atmo, alt, geom, band)
+
+###############################################################
+def numCases(spec):
+  if 'cases' in spec:
+    return len(spec['cases'])
+  return len(spec['atmospheres']) * len(spec['altitudes']) * len(spec['geometries']) \
+    * max(len(spec['bands']), 1)
+
+###############################################################
+def iterCases(spec, shard=0, nshards=1, skip=None):
+  """Yields the cases of shard (0 to nshards-1), one at a time.
+  The cases (or atmospheres, see shardby) are dealt round robin to the
+  shards.  Cases for which skip(case) is True are left out, to resume
+  a sweep.
+  """
+  atmos = []
+  for case in allCases(spec):
+    if spec['shardby'] == 'atmosphere':
+      if case.atmosphere not in atmos:
+        atmos.append(case.atmosphere)
+      unit = atmos.index(case.atmosphere)
+    else:
+      unit = case.index
+    if unit % nshards != shard:
+      continue
+    if skip is not None and skip(case):
+      continue
+    yield case
+
+###############################################################
+def caseDir(kind, atmosphere, altitude, geometry=None, band=None):
+  """Returns the case directory, band is a spec band dict or None
+  """
+  if kind == '1km':
+    return os.path.join('.', atmosphere, '{}'.format(altitude))
+  sweepdir = kind if band is None else '{}-{}'.format(kind, band['name'])
+  return os.path.join('.', atmosphere, sweepdir, '{:.0f}'.format(altitude),
+    '{:.2f}'.format(geometry))
+
+###############################################################
+def specCaseDir(spec, case):
+  return caseDir(spec['kind'], case.atmosphere, case.altitude, case.geometry, case.band)
+
+###############################################################
+def caseFields(kind, altitude, geometry=None, band=None):
+  """Returns the tape5 fields for a case, see tape5.Tape5.render
+  """
+  if kind == '1km':
+    fields = {'H1':altitude / 1000.}
+  elif kind == 'elev':
+    fields = {'H1':altitude / 1000., 'ANGLE':geometry}
+  else:
+    #horizontal path at altitude H1 over RANGE
+    fields = {'ITYPE':1, 'H1':altitude, 'RANGE':geometry, 'ANGLE':90.}
+  if band is not None:
+    fields.update(V1=band['V1'], V2=band['V2'], DV=band['DV'])
+  return fields
+
+###############################################################
+def writeTape5(tape5base, dirname, fields):
+  """Writes the template tape5base with the fields changed to dirname/tape5.
+  Returns dirname.
+  """
+  text = tape5.loadTemplate(tape5base).render(**fields)
+  if not os.path.exists(dirname):
+    os.makedirs(dirname)
+  with open(os.path.join(dirname, 'tape5'), 'w') as fout:
+    fout.write(text)
+  return dirname
+
+###############################################################
+def writeCase(spec, case, template='tape5'):
+  """Writes the tape5 of a case, from the template in the atmosphere
+  directory.  Returns the case directory.
+  """
+  return writeTape5(os.path.join(case.atmosphere, template), specCaseDir(spec, case),
+    caseFields(spec['kind'], case.altitude, case.geometry, case.band))
+
+###############################################################
+def ledgerFile(spec, shard=0, nshards=1):
+  """Returns the ledger filename for the sweep shard
+  """
+  if nshards == 1:
+    return '{}.done'.format(spec['name'])
+  return '{}-{}of{}.done'.format(spec['name'], shard, nshards)
+
+###############################################################
+class Ledger(object):
+  """The case directories that are done, one per line in filename.
+  Each case is appended and flushed as it is marked, so the ledger is
+  up to date if the sweep is interrupted.
+  """
+
+  def __init__(self, filename):
+    self.filename = filename
+    self.done = set()
+    if os.path.exists(filename):
+      with open(filename, 'rt') as fin:
+        self.done = set([line.strip() for line in fin if line.strip()])
+    self.fout = open(filename, 'at')
+
+  def close(self):
+    self.fout.close()
+
+  def markDone(self, datadir):
+    datadir = os.path.normpath(datadir)
+    if datadir not in self.done:
+      self.done.add(datadir)
+      self.fout.write(datadir + '\n')
+      self.fout.flush()
+
+  def isDone(self, datadir):
+    return os.path.normpath(datadir) in self.done
+
+##########################################################################################################
+if __name__ == '__main__':
+  import sys
+  spec = readSpec(sys.argv[1])
+  shard, nshards = (int(sys.argv[2]), int(sys.argv[3])) if len(sys.argv) > 3 else (0, 1)
+  ncases = 0
+  for case in iterCases(spec, shard, nshards):
+    print(specCaseDir(spec, case))
+    ncases += 1
+  print('{} of {} cases in shard {} of {}'.format(ncases, numCases(spec), shard, nshards))
@@ -0,0 +1,276 @@
+"""Card model of a modtran tape5 template, for generating sweep cases.
+
+A template (tape5, .ltn or .tp5 file) is parsed once into its cards:
+
+  CARD1    MODEL, ITYPE, IEMSCT, IMULT, ... I_RD2C
+  CARD1A   (not modelled, copied as is)
+  CARD2    IHAZE, ISEASN, ... VIS, GNDALT
+  CARD2C   ML, IRD1, IRD2, HMODEL, REE  (when MODEL is 0, 7 or 8 and I_RD2C=1)
+  profile  ML levels of CARD2C1 (ZM, P, T, WMOL1-3, JCHAR), each with its
+           IRD1 CARD2C2 and IRD2 CARD2C3 lines (not modelled)
+  CARD3    H1, H2, ANGLE, RANGE, BETA, RO, LENN, PHI, CKRANG
+  CARD3A1, CARD3A2  (when IEMSCT=2, not modelled)
+  CARD4    V1, V2, DV, FWHM
+  CARD5    IRPT
+
+Cases are rendered by setting named fields, the field names are unique
+over the cards:
+
+  template = tape5.loadTemplate('TropicalRural/tape5')
+  text = template.render(H1=0.305, ANGLE=135.)
+
+Only the changed fields are formatted, the rest of the template text is
+copied as is.  A value is written in the width of its field in the
+template, with the number of decimals of the template value, or fewer
+decimals if needed to fit.  A value that does not fit raises ValueError,
+as does a field name that is not in the template.
+
+The profile levels (CARD2C1) of a template can be replaced by other
+levels, e.g. perturbed profiles, see profiles.py.
+
+Templates with the optional cards 1A1-1A4, 2A, 2B, 2D or 2E (e.g. cloud
+or user-defined aerosol models) are not supported and raise ValueError,
+as do templates with a field that is not a number where one is expected
+(the error names the file, card, field and columns).
+"""
+
+import os
+
+#(name, start column, width, kind), kind 'i' integer, 'f' real, 'a' text
+cardFields = {
+  'CARD1':[('MODTRN', 0, 1, 'a'), ('SPEED', 1, 1, 'a'), ('BINARY', 2, 1, 'a'),
+    ('LYMOLC', 3, 1, 'a'), ('MODEL', 4, 1, 'i'), ('T_BEST', 5, 1, 'a'), ('ITYPE', 6, 4, 'i'),
+    ('IEMSCT', 10, 5, 'i'), ('IMULT', 15, 5, 'i'), ('M1', 20, 5, 'i'), ('M2', 25, 5, 'i'),
+    ('M3', 30, 5, 'i'), ('M4', 35, 5, 'i'), ('M5', 40, 5, 'i'), ('M6', 45, 5, 'i'),
+    ('MDEF', 50, 5, 'i'), ('I_RD2C', 55, 5, 'i'), ('NOPRNT', 61, 4, 'i'),
+    ('TPTEMP', 65, 8, 'f'), ('SURREF', 73, 7, 'a')],
+  'CARD1A':[],
+  'CARD2':[('APLUS', 0, 2, 'a'), ('IHAZE', 2, 3, 'i'), ('CNOVAM', 5, 1, 'a'),
+    ('ISEASN', 6, 4, 'i'), ('ARUSS', 10, 3, 'a'), ('IVULCN', 13, 2, 'i'), ('ICSTL', 15, 5, 'i'),
+    ('ICLD', 20, 5, 'i'), ('IVSA', 25, 5, 'i'), ('VIS', 30, 10, 'f'), ('WSS', 40, 10, 'f'),
+    ('WHH', 50, 10, 'f'), ('RAINRT', 60, 10, 'f'), ('GNDALT', 70, 10, 'f')],
+  'CARD2C':[('ML', 0, 5, 'i'), ('IRD1', 5, 5, 'i'), ('IRD2', 10, 5, 'i'),
+    ('HMODEL', 15, 20, 'a'), ('REE', 35, 10, 'f')],
+  'CARD2C1':[('ZM', 0, 10, 'f'), ('P', 10, 10, 'f'), ('T', 20, 10, 'f'),
+    ('WMOL1', 30, 10, 'f'), ('WMOL2', 40, 10, 'f'), ('WMOL3', 50, 10, 'f'), ('JCHAR', 60, 14, 'a')],
+  'CARD3':[('H1', 0, 10, 'f'), ('H2', 10, 10, 'f'), ('ANGLE', 20, 10, 'f'),
+    ('RANGE', 30, 10, 'f'), ('BETA', 40, 10, 'f'), ('RO', 50, 10, 'f'), ('LENN', 60, 5, 'i'),
+    ('PHI', 70, 10, 'f'), ('CKRANG', 80, 10, 'f')],
+  'CARD3A1':[],
+  'CARD3A2':[],
+  'CARD4':[('V1', 0, 10, 'f'), ('V2', 10, 10, 'f'), ('DV', 20, 10, 'f'), ('FWHM', 30, 10, 'f')],
+  'CARD5':[('IRPT', 0, 5, 'i')],
+  }
+
+#models that read the profile in CARD2C
+profileModels = [0, 7, 8]
+
+###############################################################
+def parseField(text, kind):
+  """Returns the value of the field text
+  """
+  if kind == 'a':
+    return text
+  text = text.strip()
+  if kind == 'i':
+    return int(text) if text else 0
+  return float(text.replace('D', 'E').replace('d', 'e')) if text else 0.
+
+###############################################################
+def fieldStyle(text, width):
+  """Returns the format style ('f' or 'E') and number of decimals of a
+  real field in the template
+  """
+  text = text.strip().upper()
+  style = 'E' if 'E' in text else 'f'
+  mantissa = text.split('E')[0]
+  if '.' in mantissa:
+    return style, len(mantissa) - mantissa.index('.') - 1
+  return style, 3 if width > 5 else 0
+
+###############################################################
+def formatField(name, value, width, kind, style):
+  """Returns value formatted in width columns, raises ValueError if it does not fit
+  """
+  if kind == 'a':
+    text = '{}'.format(value)
+    if len(text) > width:
+      raise ValueError('{} = {!r} is wider than {} columns'.format(name, value, width))
+    return text.ljust(width)
+  if kind == 'i':
+    if int(value) != value:
+      raise ValueError('{} = {!r} is not an integer'.format(name, value))
+    text = '{:{}d}'.format(int(value), width)
+    if len(text) > width:
+      raise ValueError('{} = {!r} is wider than {} columns'.format(name, value, width))
+    return text
+  fmt, decimals = style
+  for ndec in range(decimals, -1, -1):
+    text = '{:{}.{}{}}'.format(float(value), width, ndec, fmt)
+    if len(text) <= width:
+      return text
+  raise ValueError('{} = {!r} is wider than {} columns'.format(name, value, width))
+
+###############################################################
+class Card(object):
+  """A tape5 card: the template line and its parsed fields
+  """
+
+  def __init__(self, name, line):
+    self.name = name
+    self.line = line
+    self.fields = {}
+    self.values = {}
+    for field, start, width, kind in cardFields[name]:
+      text = line[start:start+width]
+      self.fields[field] = (start, width, kind, fieldStyle(text, width) if kind == 'f' else None)
+      try:
+        self.values[field] = parseField(text, kind)
+      except ValueError:
+        raise ValueError('{} {} (columns {}-{}): {!r} is not {}'.format(name, field, start + 1,
+          start + width, text, 'an integer' if kind == 'i' else 'a number'))
+
+  def __getitem__(self, field):
+    return self.values[field]
+
+  def render(self, changes):
+    """Returns the line with the changed fields, changes is a dict
+    """
+    line = self.line
+    for field, value in changes.items():
+      start, width, kind, style = self.fields[field]
+      if len(line) < start:
+        line = line.ljust(start)
+      line = line[:start] + formatField(field, value, width, kind, style) + line[start+width:]
+    return line
+
+###############################################################
+class Tape5(object):
+  """Card model of a tape5 template, see the module docstring
+  """
+
+  def __init__(self, lines):
+    lines = [line.rstrip('\r\n') for line in lines]
+    self.cards = {}
+    self.card1 = self.addCard('CARD1', lines[0])
+    self.card1a = self.addCard('CARD1A', lines[1])
+    self.card2 = self.addCard('CARD2', lines[2])
+    if self.card2['ICLD'] != 0 or self.card2['IVSA'] != 0 or self.card2['IHAZE'] == 7 \
+        or self.card2['ARUSS'].strip():
+      raise ValueError('templates with CARD2A, 2B, 2D or 2E are not supported')
+
+    #the profile levels, each a CARD2C1 and its CARD2C2/2C3 lines
+    self.card2c = None
+    self.profile = []
+    iline = 3
+    if self.hasProfile(self.card1.values):
+      self.card2c = self.addCard('CARD2C', lines[iline])
+      nextra = self.card2c['IRD1'] + self.card2c['IRD2']
+      iline += 1
+      for level in range(self.card2c['ML']):
+        self.profile.append((Card('CARD2C1', lines[iline]), lines[iline+1:iline+1+nextra]))
+        iline += 1 + nextra
+
+    self.card3 = self.addCard('CARD3', lines[iline])
+    iline += 1
+    self.card3a = []
+    if self.card1['IEMSCT'] == 2:
+      self.card3a = [Card('CARD3A1', lines[iline]), Card('CARD3A2', lines[iline+1])]
+      iline += 2
+    self.card4 = self.addCard('CARD4', lines[iline])
+    self.card5 = self.addCard('CARD5', lines[iline+1])
+    #further runs in the template (IRPT), copied as is
+    self.tail = lines[iline+2:]
+
+    self.fieldCards = {}
+    for card in self.cards.values():
+      for field in card.fields:
+        self.fieldCards[field] = card.name
+
+  def addCard(self, name, line):
+    self.cards[name] = Card(name, line)
+    return self.cards[name]
+
+  def hasProfile(self, card1values):
+    return card1values['MODEL'] in profileModels and card1values['I_RD2C'] == 1
+
+  def __getitem__(self, field):
+    """Returns the template value of field
+    """
+    return self.cards[self.fieldCards[field]][field]
+
+  def render(self, levels=None, **fields):
+    """Returns the tape5 text with the fields changed
+    """
+    return '\n'.join(self.renderLines(fields, levels)) + '\n'
+
+  def renderLines(self, fields, levels=None):
+    """Returns the tape5 lines with the fields (a dict) changed.
+    levels are CARD2C1 lines to replace the profile levels of the
+    template (see profiles.py), ML is set to their number.
+    """
+    changes = {}
+    for field, value in fields.items():
+      if field not in self.fieldCards:
+        raise ValueError('{} is not a field of the template cards'.format(field))
+      changes.setdefault(self.fieldCards[field], {})[field] = value
+    lines = {}
+    for name, cardchanges in changes.items():
+      lines[name] = self.cards[name].render(cardchanges)
+
+    card1values = dict(self.card1.values, **changes.get('CARD1', {}))
+    out = [lines.get('CARD1', self.card1.line), self.card1a.line, lines.get('CARD2', self.card2.line)]
+    if self.hasProfile(card1values):
+      if self.card2c is None:
+        raise ValueError('MODEL {} needs a profile (CARD2C), the template has none'.format(
+          card1values['MODEL']))
+      nlevels = len(self.profile) if levels is None else len(levels)
+      if 'ML' in fields and fields['ML'] != nlevels:
+        raise ValueError('ML = {} but there are {} profile levels'.format(fields['ML'], nlevels))
+      card2cline = lines.get('CARD2C', self.card2c.line)
+      if nlevels != len(self.profile):
+        if any([extra for card, extra in self.profile]):
+          raise ValueError('the template has CARD2C2/2C3 lines for {} profile levels, not {}'.format(
+            len(self.profile), nlevels))
+        card2cline = Card('CARD2C', card2cline).render({'ML':nlevels})
+      out.append(card2cline)
+      if levels is None:
+        levels = [card.line for card, extra in self.profile]
+      for level, line in enumerate(levels):
+        out.append(line)
+        if level < len(self.profile):
+          out.extend(self.profile[level][1])
+    out.append(lines.get('CARD3', self.card3.line))
+    if card1values['IEMSCT'] == 2:
+      if not self.card3a:
+        raise ValueError('IEMSCT = 2 needs CARD3A1 and 3A2, the template has none')
+      out.extend([card.line for card in self.card3a])
+    out.append(lines.get('CARD4', self.card4.line))
+    out.append(lines.get('CARD5', self.card5.line))
+    out.extend(self.tail)
+    return out
+
+###############################################################
+def readTape5(filename):
+  """Returns the card model of the tape5 template in filename.
+  A template that cannot be parsed raises ValueError, with the filename.
+  """
+  with open(filename, 'rt') as fin:
+    lines = fin.readlines()
+  try:
+    return Tape5(lines)
+  except ValueError as error:
+    raise ValueError('{}: {}'.format(filename, error))
+
+#parsed templates, keyed by filename and modification time
+templates = {}
+
+###############################################################
+def loadTemplate(filename):
+  """Returns the card model of the template in filename, parsed once per
+  process and again only if the file changed
+  """
+  key = (os.path.abspath(filename), os.path.getmtime(filename))
+  if key not in templates:
+    templates[key] = readTape5(filename)
+  return templates[key]
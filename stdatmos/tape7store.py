@@ -0,0 +1,186 @@
+"""Binary columnar store for tape7 and other spectral data.
+
+Parsing the ASCII tape7 (rymodtran.loadtape7) or the .1km text files
+(np.loadtxt) is slow.  Here a tape7 is read once and each column is
+written to its own .npy file.  Readers memory-map only the columns they
+need, the data are read from disk when used.
+
+store dir structure:
+|dir case dir, e.g. <dir>/elev/<alt>/<elev>
+  |file tape7
+  | dir tape7.store
+    |file meta.json  (scenario, altitude, elevation, columns, source file)
+    |file FREQ.npy
+    |file TOT_TRANS.npy
+    |file ...
+
+The store is rebuilt when the tape7 is newer or differs in size from the
+tape7 that the store was made from.
+
+To convert all the tape7 files below the current directory:
+  python -m stdatmos.tape7store .
+"""
+
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import numpy as np
+
+#tape7 columns used in the post-processing
+tape7Columns = ['FREQ', 'TOT_TRANS', 'TOA_SUN', 'TOTAL_RAD', 'DEPTH']
+
+#directories not searched by ingestTree: the result cache of the domodtran
+#scripts (see cache.py), besides the stores (*.store) and temporary dirs (tmp-*)
+skipDirs = ['modtrancache']
+
+###############################################################
+def columnFilename(column):
+  """Returns the .npy filename for a column name such as 'BBODY_T[K]'
+  """
+  return re.sub(r'[^0-9A-Za-z_\-]', '_', column) + '.npy'
+
+###############################################################
+def writeStore(storedir, columns, meta=None):
+  """Writes the dict of 1-D arrays in columns to storedir, one .npy file
+  per column, plus the dict meta to meta.json.  An existing store is replaced.
+  """
+  meta = dict(meta) if meta is not None else {}
+  meta['columns'] = list(columns.keys())
+  parent = os.path.dirname(os.path.abspath(storedir))
+  tmpdir = tempfile.mkdtemp(prefix='tmp-', dir=parent)
+  for column in columns:
+    np.save(os.path.join(tmpdir, columnFilename(column)), np.ascontiguousarray(columns[column]))
+  meta['nrows'] = int(len(columns[meta['columns'][0]])) if meta['columns'] else 0
+  with open(os.path.join(tmpdir, 'meta.json'), 'wt') as fout:
+    json.dump(meta, fout, indent=1)
+  if os.path.exists(storedir):
+    shutil.rmtree(storedir)
+  os.rename(tmpdir, storedir)
+
+###############################################################
+def readMeta(storedir):
+  """Returns the meta dict of the store, or None if there is no store
+  """
+  filename = os.path.join(storedir, 'meta.json')
+  if not os.path.exists(filename):
+    return None
+  with open(filename, 'rt') as fin:
+    return json.load(fin)
+
+###############################################################
+def readStore(storedir, columns=None, mmap_mode='r'):
+  """Returns a dict of the arrays for columns (default all) in storedir.
+  The arrays are memory-mapped, use mmap_mode=None to read into memory.
+  """
+  if columns is None:
+    columns = readMeta(storedir)['columns']
+  return dict([(column, np.load(os.path.join(storedir, columnFilename(column)),
+    mmap_mode=mmap_mode)) for column in columns])
+
+###############################################################
+def sourceStamp(filename):
+  """Returns [size, mtime] of the file, to detect a changed source
+  """
+  stat = os.stat(filename)
+  return [stat.st_size, stat.st_mtime]
+
+###############################################################
+def isCurrent(storedir, sourcefile, columns):
+  """Returns True if the store was made from sourcefile as it is now,
+  and holds all the columns.
+  """
+  meta = readMeta(storedir)
+  if meta is None or meta.get('sourcestamp') != sourceStamp(sourcefile):
+    return False
+  return all([column in meta['columns'] for column in columns])
+
+###############################################################
+def ingestTape7(datadir, colspec=None, meta=None):
+  """Reads datadir/tape7 and writes the columns in colspec to
+  datadir/tape7.store.  meta holds scenario, altitude, elevation etc.
+  Returns the store directory.
+  """
+  import pyradi.rymodtran as rymodtran
+
+  if colspec is None:
+    colspec = tape7Columns
+  filename = os.path.join(datadir, 'tape7')
+  storedir = os.path.join(datadir, 'tape7.store')
+  tape7 = rymodtran.loadtape7(filename, colspec)
+  meta = dict(meta) if meta is not None else {}
+  meta['source'] = filename
+  meta['sourcestamp'] = sourceStamp(filename)
+  writeStore(storedir, dict([(col, tape7[:, i]) for i, col in enumerate(colspec)]), meta)
+  return storedir
+
+###############################################################
+def loadTape7(datadir, colspec, meta=None):
+  """Returns the columns in colspec from datadir/tape7 as a 2-D array,
+  like rymodtran.loadtape7.  The tape7 is ingested into the store on
+  first use (or when it changed), after that only the store is read.
+  """
+  storedir = os.path.join(datadir, 'tape7.store')
+  if not isCurrent(storedir, os.path.join(datadir, 'tape7'), colspec):
+    #keep the columns already in the store
+    oldmeta = readMeta(storedir)
+    columns = list(tape7Columns)
+    if oldmeta is not None:
+      columns += [col for col in oldmeta['columns'] if col not in columns]
+    columns += [col for col in colspec if col not in columns]
+    ingestTape7(datadir, columns, meta)
+  data = readStore(storedir, colspec)
+  return np.column_stack([data[col] for col in colspec])
+
+###############################################################
+def caseMeta(datadir):
+  """Returns the scenario, altitude and elevation or range of a case
+  directory in the <dir>/elev/<alt>/<elev>, <dir>/horizontal/<alt>/<range>
+  or <dir>/<alt> layout.  The sweep directory can have a band suffix,
+  e.g. <dir>/elev-MWIR/<alt>/<elev> (see sweep.py).
+  """
+  parts = os.path.normpath(datadir).split(os.sep)
+  meta = {}
+  sweepdir = parts[-3].split('-', 1) if len(parts) >= 4 else ['']
+  if sweepdir[0] in ['elev', 'horizontal']:
+    meta['scenario'] = parts[-4]
+    meta['altitude'] = float(parts[-2])
+    meta['elevation' if sweepdir[0] == 'elev' else 'range'] = float(parts[-1])
+    if len(sweepdir) > 1:
+      meta['band'] = sweepdir[1]
+  elif len(parts) >= 2:
+    meta['scenario'] = parts[-2]
+    meta['altitude'] = float(parts[-1])
+  return meta
+
+###############################################################
+def ingestTree(rootdir, colspec=None):
+  """Ingests all the tape7 files below rootdir that are not in a current store.
+  The skipDirs, stores and temporary dirs are not searched.
+  Returns the number of tape7 files ingested.
+  """
+  if colspec is None:
+    colspec = tape7Columns
+  ningested = 0
+  for dirpath, dirnames, filenames in os.walk(rootdir):
+    dirnames[:] = [name for name in dirnames if name not in skipDirs
+      and not name.endswith('.store') and not name.startswith('tmp-')]
+    if 'tape7' not in filenames:
+      continue
+    storedir = os.path.join(dirpath, 'tape7.store')
+    if isCurrent(storedir, os.path.join(dirpath, 'tape7'), colspec):
+      continue
+    try:
+      meta = caseMeta(dirpath)
+    except ValueError:
+      meta = {}
+    ingestTape7(dirpath, colspec, meta)
+    ningested += 1
+  return ningested
+
+##########################################################################################################
+if __name__ == '__main__':
+  for rootdir in sys.argv[1:]:
+    print('{}: {} tape7 files ingested'.format(rootdir, ingestTree(rootdir)))
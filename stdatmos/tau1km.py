@@ -0,0 +1,113 @@
+"""Vectorised 1 km transmittance for all the altitudes of a scenario.
+
+domodtran.py rescales the optical depth of each tape7 to a 1 km path,
+smooths the transmittance with ryutils.convolve and interpolates it to a
+wavelength scale.  Here the same steps are done for all the altitudes of
+a scenario at once, on a 2-D array (altitudes x wavenumbers):
+
+ - rescale: exp(-DEPTH * 1e3 / (alt / cos(slantangle))) for all rows,
+ - smooth: one scipy.ndimage.convolve1d along the rows, with the same
+   Bartlett window as ryutils.convolve,
+ - resample: the sparse matrix from the wavenumber grid to the
+   wavelength grid is calculated once per grid and applied to all rows,
+   see resample.py.
+
+The result is written to a single binary store per scenario,
+<dir>/<dir>.1km.store, with columns WAVELENGTH (wlnum,) and
+TAU1KM (nalts, wlnum) and the altitudes in the meta data.
+
+The spreadsheets of domodtran.py are written from the scenario stores by
+export.writeTau1km, the plots by plotting.plotTau.  scipy is imported
+only when it is used, not when the module is imported.
+"""
+
+import os
+import numpy as np
+
+import stdatmos.resample as resample
+import stdatmos.tape7store as tape7store
+
+###############################################################
+def smoothingWindow(samplingresolution, inwinwidth, outwinwidth):
+  """Returns the normalised Bartlett window used by ryutils.convolve
+  """
+  winbins = int(round(2 * (outwinwidth / (inwinwidth * samplingresolution)), 0))
+  winbins = winbins if winbins % 2 == 1 else winbins + 1
+  windowfn = np.bartlett(winbins)
+  return windowfn / (samplingresolution * windowfn.sum())
+
+###############################################################
+def smoothRows(spectra, samplingresolution=1, inwinwidth=1, outwinwidth=8):
+  """Convolves each row of spectra with the ryutils.convolve window,
+  the same as ryutils.convolve(row, ...) with mode='same'.
+  """
+  import scipy.ndimage as ndimage
+  window = smoothingWindow(samplingresolution, inwinwidth, outwinwidth)
+  return ndimage.convolve1d(spectra, window, axis=-1, mode='constant', cval=0.)
+
+###############################################################
+def tau1kmBatch(freq, depth, alts, slantangle, wlnum, inwinwidth=1, outwinwidth=8):
+  """Returns the wavelength grid and the smoothed 1 km transmittance
+  (nalts, wlnum) from the optical depth (nalts, nfreq) over the slant
+  paths from the altitudes alts (m) at slantangle (radians).
+  """
+  alts = np.asarray(alts, dtype=np.float64).reshape(-1, 1)
+  tau = np.exp(- depth * 1.0e3 / (alts / np.cos(slantangle)))
+  tau = smoothRows(tau, 1, inwinwidth, outwinwidth)
+  resampler = resample.resampler(freq, wlnum)
+  return resampler.wl, resampler.apply(tau)
+
+###############################################################
+def scenarioStore(directory):
+  return os.path.join('.', directory, '{}.1km.store'.format(directory))
+
+###############################################################
+def calcScenario(directory, alts, datadirs, slantangle, wlnum):
+  """Calculates the 1 km transmittance for all the altitudes of a scenario
+  from the tape7 files in datadirs and writes it to the scenario store,
+  keeping the other altitudes already in the store.
+  """
+  tape7s = [tape7store.loadTape7(datadir, ['FREQ', 'DEPTH']) for datadir in datadirs]
+  freq = tape7s[0][:,0]
+  for datadir, tape7 in zip(datadirs, tape7s):
+    if not np.array_equal(freq, tape7[:,0]):
+      raise ValueError('{} has a different wavenumber grid'.format(datadir))
+  depth = np.stack([tape7[:,1] for tape7 in tape7s])
+  wl, tau = tau1kmBatch(freq, depth, alts, slantangle, wlnum)
+  alts, tau = mergeScenario(directory, list(alts), wl, tau)
+  tape7store.writeStore(scenarioStore(directory), {'WAVELENGTH':wl, 'TAU1KM':tau},
+    meta={'scenario':directory, 'altitudes':alts})
+
+###############################################################
+def mergeScenario(directory, alts, wl, tau):
+  """Returns the altitudes (sorted) and 1 km transmittance of alts and tau
+  (nalts, wlnum), with the other altitudes already in the scenario store,
+  so that a resumed sweep adds to the store
+  """
+  if not os.path.exists(scenarioStore(directory)):
+    return alts, tau
+  salts, swl, stau = readScenario(directory)
+  if not np.array_equal(wl, swl):
+    raise ValueError('{} has a different wavelength grid, remove it to recalculate all '
+      'altitudes'.format(scenarioStore(directory)))
+  keep = [i for i, alt in enumerate(salts) if alt not in alts]
+  allalts = [salts[i] for i in keep] + alts
+  alltau = np.concatenate((np.array(stau[keep]), tau))
+  order = np.argsort(allalts, kind='stable')
+  return [allalts[i] for i in order], alltau[order]
+
+###############################################################
+def readScenario(directory):
+  """Returns the altitudes, wavelengths and memory-mapped 1 km
+  transmittance (nalts, wlnum) of a scenario
+  """
+  storedir = scenarioStore(directory)
+  data = tape7store.readStore(storedir, ['WAVELENGTH', 'TAU1KM'])
+  return tape7store.readMeta(storedir)['altitudes'], data['WAVELENGTH'], data['TAU1KM']
+
+###############################################################
+def load1km(alt, directory):
+  """Returns the 1 km transmittance as two columns: wavelength and transmittance
+  """
+  salts, wl, tau = readScenario(directory)
+  return np.column_stack((wl, tau[salts.index(alt)]))
@@ -0,0 +1,25 @@
+import os
+import pytest
+
+import stdatmos.sweep as sweep
+
+repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+templateFile = os.path.join(repoDir, 'TropicalRural', 'TropicalRural.ltn')
+#a small spectral range, so that the stub runs quickly
+stubBand = {'name':'stub', 'V1':2000., 'V2':2100., 'DV':5.}
+
+###############################################################
+@pytest.fixture
+def elevCases(tmp_path):
+  """Returns a function that writes the tape5 of elevation cases of
+  TropicalRural in tmp_path, and returns their directories
+  """
+  def writeCases(zeniths, altitude=0.):
+    datadirs = []
+    for zenith in zeniths:
+      dirname = os.path.join(str(tmp_path), sweep.caseDir('elev', 'TropicalRural', altitude, zenith))
+      fields = dict(sweep.caseFields('elev', altitude, zenith), V1=stubBand['V1'],
+        V2=stubBand['V2'], DV=stubBand['DV'])
+      datadirs.append(sweep.writeTape5(templateFile, dirname, fields))
+    return datadirs
+  return writeCases
@@ -0,0 +1,114 @@
+import os
+import sys
+
+import stdatmos.cache as cache
+import stdatmos.runner as runner
+import stdatmos.stubmodtran as stubmodtran
+
+###############################################################
+def writeCase(datadir, tape6=100, tape7=900):
+  """Writes a tape6 and tape7 of the given sizes to datadir, total 1000 bytes
+  """
+  os.makedirs(datadir, exist_ok=True)
+  for name, size in [('tape6', tape6), ('tape7', tape7)]:
+    with open(os.path.join(datadir, name), 'wb') as fout:
+      fout.write(b'x' * size)
+  return datadir
+
+###############################################################
+def countScans(monkeypatch):
+  """Counts the scans of the cache entries, returns the counter list
+  """
+  scans = []
+  entries = cache.ResultCache.entries
+  def counted(self):
+    scans.append(1)
+    return entries(self)
+  monkeypatch.setattr(cache.ResultCache, 'entries', counted)
+  return scans
+
+###############################################################
+def test_caseKey(tmp_path):
+  tape5file = str(tmp_path / 'tape5')
+  exefile = str(tmp_path / 'modtran')
+  with open(exefile, 'wb') as fout:
+    fout.write(b'modtran')
+  modtranexe = [sys.executable, exefile]
+  with open(tape5file, 'wb') as fout:
+    fout.write(b'TMF 7    2    2\nline two\n')
+  key = cache.caseKey(tape5file, modtranexe)
+  assert cache.caseKey(tape5file, modtranexe) == key
+
+  #line endings do not change the key
+  with open(tape5file, 'wb') as fout:
+    fout.write(b'TMF 7    2    2\r\nline two\r\n')
+  assert cache.caseKey(tape5file, modtranexe) == key
+
+  #the tape5 text does
+  with open(tape5file, 'wb') as fout:
+    fout.write(b'TMF 7    2    2\nline 2\n')
+  assert cache.caseKey(tape5file, modtranexe) != key
+  with open(tape5file, 'wb') as fout:
+    fout.write(b'TMF 7    2    2\nline two\n')
+
+  #and the size and modification time of the executable
+  stat = os.stat(exefile)
+  os.utime(exefile, (stat.st_atime, stat.st_mtime - 100))
+  mtimekey = cache.caseKey(tape5file, modtranexe)
+  assert mtimekey != key
+  with open(exefile, 'ab') as fout:
+    fout.write(b' 5')
+  os.utime(exefile, (stat.st_atime, stat.st_mtime - 100))
+  assert cache.caseKey(tape5file, modtranexe) not in [key, mtimekey]
+
+###############################################################
+def test_runCached(elevCases, tmp_path):
+  datadir, = elevCases([30.])
+  resultcache = cache.ResultCache(str(tmp_path / 'cache'))
+  first = runner.runModtran(datadir, stubmodtran.stubCommand(), resultcache=resultcache)
+  with open(os.path.join(datadir, 'tape7'), 'rb') as fin:
+    tape7 = fin.read()
+  os.remove(os.path.join(datadir, 'tape7'))
+  second = runner.runModtran(datadir, stubmodtran.stubCommand(), resultcache=resultcache)
+  assert first.returncode == 0 and not first.cached
+  assert second.returncode == 0 and second.cached
+  with open(os.path.join(datadir, 'tape7'), 'rb') as fin:
+    assert fin.read() == tape7
+
+###############################################################
+def test_evictLeastRecentlyUsed(tmp_path):
+  datadir = writeCase(str(tmp_path / 'case'))
+  resultcache = cache.ResultCache(str(tmp_path / 'cache'), maxbytes=5000)
+  keys = ['{:064x}'.format(i) for i in range(6)]
+  for i, key in enumerate(keys[:5]):
+    resultcache.store(key, datadir)
+    os.utime(resultcache.entryDir(key), (1000. + i, 1000. + i))
+  assert resultcache.size() == 5000
+  #a fetch makes the oldest entry the most recently used
+  assert resultcache.fetch(keys[0], str(tmp_path / 'case'))
+  resultcache.store(keys[5], datadir)
+  #evicted down to (1 - rescanFraction) of the cap, least recently used first
+  present = [resultcache.fetch(key, datadir) for key in keys]
+  assert present == [True, False, False, True, True, True]
+  assert resultcache.size() == 4000
+
+###############################################################
+def test_runningTotal(tmp_path, monkeypatch):
+  scans = countScans(monkeypatch)
+  datadir = writeCase(str(tmp_path / 'case'))
+  cachedir = str(tmp_path / 'cache')
+  resultcache = cache.ResultCache(cachedir, maxbytes=100000)
+  for i in range(5):
+    resultcache.store('{:064x}'.format(i), datadir)
+  #scanned once, on the first store
+  assert len(scans) == 1
+  assert cache.cacheTotals[os.path.abspath(cachedir)] == [5000, 4000]
+
+  #rescanned after rescanFraction of the cap is stored, which counts the
+  #entries stored by another process
+  writeCase(os.path.join(cachedir, 'ff', 'f' * 64), tape7=2900)
+  for i in range(5, 12):
+    resultcache.store('{:064x}'.format(i), datadir)
+  assert len(scans) == 2
+  assert cache.cacheTotals[os.path.abspath(cachedir)] == [15000, 0]
+  assert resultcache.size() == 15000
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+import stdatmos.integrate as integrate
+import stdatmos.stubmodtran as stubmodtran
+
+#bands in um, with edges between the grid samples, and a band with one sample
+specRanges = {'MWIR':[3.7, 4.8], 'CO2':[4.15, 4.45], 'wide':[3.45, 5.3], 'one':[4.0, 4.0003]}
+temps = [6000., 300., 1000.]
+
+###############################################################
+def stubStack():
+  """Returns the wavenumber grid (N,) and the stub transmittance, sun and
+  path radiance (W/(m2.sr.cm-1)) of three zenith angles (3, N)
+  """
+  spectra = np.stack([stubmodtran.stubSpectra(0., angle, 1800., 3000., 2.5)
+    for angle in [0., 60., 85.]])
+  columns = stubmodtran.tape7Columns
+  freq = spectra[0, :, columns.index('FREQ')]
+  return freq, spectra[:, :, columns.index('TOT_TRANS')], \
+    spectra[:, :, columns.index('TOA_SUN')] * 1e4, spectra[:, :, columns.index('TOTAL_RAD')] * 1e4
+
+###############################################################
+def bandSelect(freq, key):
+  return (freq >= 1e4 / specRanges[key][1]) & (freq <= 1e4 / specRanges[key][0])
+
+###############################################################
+def planckWn(freq, temp):
+  return freq ** 3 / np.expm1(1.4387752 * freq / temp)
+
+###############################################################
+def referenceEffTau(freq, trans, key, temp):
+  """Returns the effective transmittance of each spectrum in the band,
+  integrated band by band as the baseline did
+  """
+  select = bandSelect(freq, key)
+  radiance = planckWn(freq[select], temp)
+  with np.errstate(invalid='ignore', divide='ignore'):
+    return np.trapezoid(radiance * trans[:, select], freq[select]) \
+      / np.trapezoid(radiance, freq[select])
+
+###############################################################
+def test_bandSums():
+  freq, trans, toasun, pathrad = stubStack()
+  keys = list(specRanges.keys())
+  lo, hi = integrate.bandEdges(freq, specRanges, keys)
+  bands = integrate.bandIntegrate(integrate.trapzAreas(pathrad, freq), lo, hi)
+  for k, key in enumerate(keys):
+    select = bandSelect(freq, key)
+    np.testing.assert_allclose(bands[:, k], np.trapezoid(pathrad[:, select], freq[select]),
+      rtol=1e-12, atol=0.)
+
+###############################################################
+def test_bandIntegrals():
+  pytest.importorskip('pyradi.ryplanck')
+  import scipy.constants as const
+  freq, trans, toasun, pathrad = stubStack()
+  keys = list(specRanges.keys())
+  results = integrate.bandIntegrals(freq, trans, toasun, pathrad, specRanges, keys, temps)
+  conv = freq * const.h * const.c * 1e2
+  for unit, scale in [('Watt', 1.), ('Q', 1. / conv)]:
+    np.testing.assert_allclose(results['Toa{}Tot'.format(unit)][:, 0],
+      np.trapezoid(toasun * scale, freq), rtol=1e-12)
+    np.testing.assert_allclose(results['Boa{}Tot'.format(unit)][:, 0],
+      np.trapezoid(toasun * trans * scale, freq), rtol=1e-12)
+    for k, key in enumerate(keys):
+      select = bandSelect(freq, key)
+      for column, spectra in [('Toa', toasun), ('Boa', toasun * trans), ('Lpath', pathrad)]:
+        np.testing.assert_allclose(results[column + unit][:, k],
+          np.trapezoid((spectra * scale)[:, select], freq[select]), rtol=1e-12, atol=0.)
+  for temp in temps:
+    for k, key in enumerate(keys):
+      np.testing.assert_allclose(results[integrate.effColumn(temp)][:, k],
+        referenceEffTau(freq, trans, key, temp), rtol=1e-12)
+
+###############################################################
+def test_effectiveTransmittance():
+  pytest.importorskip('pyradi.ryplanck')
+  import stdatmos.planck as planck
+  freq, trans, toasun, pathrad = stubStack()
+  keys = ['MWIR', 'CO2', 'wide']
+  efftau = planck.effectiveTransmittance(freq, trans, specRanges, temps, keys)
+  assert efftau.shape == (trans.shape[0], len(temps), len(keys))
+  for i, temp in enumerate(temps):
+    for k, key in enumerate(keys):
+      np.testing.assert_allclose(efftau[:, i, k], referenceEffTau(freq, trans, key, temp),
+        rtol=1e-12)
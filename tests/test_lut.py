@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import stdatmos.lut as lut
+
+###############################################################
+def makeTable():
+  """Returns a table of one quantity, atmosphere and band, with the
+  value at (altitude 1, zenith 20) missing
+  """
+  values = np.array([[0., 1., 2.], [10., 11., np.nan]]).reshape(1, 1, 1, 2, 3)
+  return lut.AtmoLUT(['effTauSun'], ['A'], ['MWIR'], [0., 1.], [0., 10., 20.], values)
+
+###############################################################
+def test_lookupNextToMissing():
+  table = makeTable()
+  #on grid points and between grid points that have results
+  values = table.lookup('effTauSun', 'A', 'MWIR', [1., 1., 0., 0.5], [10., 5., 20., 5.])
+  np.testing.assert_allclose(values, [11., 10.5, 2., 5.5])
+
+###############################################################
+def test_lookupWeightOnMissing():
+  table = makeTable()
+  values = table.lookup('effTauSun', 'A', 'MWIR', [1., 0.5, 1.], [20., 15., 15.])
+  assert np.isnan(values).all()
+
+###############################################################
+def test_index():
+  names = ['TropicalRural', 'MidLatSummer', 'Arctic']
+  table = lut.AtmoLUT(['q'], names, ['MWIR'], [0.], [0.], np.zeros((1, 3, 1, 1, 1)))
+  items = np.array([['Arctic', 'TropicalRural'], ['MidLatSummer', 'Arctic']])
+  np.testing.assert_array_equal(table.index(names, items), [[2, 0], [1, 2]])
+  assert table.index(names, 'MidLatSummer') == 1
+  np.testing.assert_array_equal(table.index(names, [2, 0]), [2, 0])
+  for unknown in ['Tropical', 'Zulu', ['Arctic', 'A']]:
+    with pytest.raises(KeyError):
+      table.index(names, unknown)
@@ -0,0 +1,51 @@
+import numpy as np
+
+import stdatmos.rangesweep as rangesweep
+import stdatmos.stubmodtran as stubmodtran
+
+###############################################################
+def stubReference(pathrange):
+  """Returns the stub spectra of a horizontal path of pathrange km as a
+  dict of rangesweep.tape7Columns, with synthetic surface terms
+  """
+  data = stubmodtran.stubSpectra(1., 90., 1800., 3000., 2.5, pathrange)
+  spectra = dict([(column, data[:, i]) for i, column in enumerate(stubmodtran.tape7Columns)])
+  for i, column in enumerate(rangesweep.surfaceColumns):
+    spectra[column] = (i + 1) * 1e-7 * spectra['TOT_TRANS']
+  spectra['TOTAL_RAD'] = spectra['TOTAL_RAD'] + np.sum([spectra[column]
+    for column in rangesweep.surfaceColumns], axis=0)
+  return dict([(column, spectra[column]) for column in rangesweep.tape7Columns + ['TOT_TRANS']])
+
+###############################################################
+def test_referenceRange():
+  reference = stubReference(2.)
+  spectra = rangesweep.expandRanges(reference, [0.5, 2., 8.], 2.)
+  for column in rangesweep.tape7Columns:
+    if column != 'FREQ':
+      assert spectra[column].shape == (3, reference['FREQ'].shape[0])
+      np.testing.assert_allclose(spectra[column][1], reference[column], rtol=1e-12, atol=0.)
+  np.testing.assert_allclose(spectra['TOT_TRANS'][1], reference['TOT_TRANS'], rtol=1e-12)
+
+###############################################################
+def test_stubRanges():
+  #the stub spectra follow Beer-Lambert exactly, so the expansion gives
+  #the stub spectra of the other ranges, but for the surface terms
+  reference = stubReference(2.)
+  ranges = [0.1, 1., 5., 20.]
+  spectra = rangesweep.expandRanges(reference, ranges, 2.)
+  for i, pathrange in enumerate(ranges):
+    direct = stubReference(pathrange)
+    for column in ['DEPTH', 'PTH_THRML', 'SOL_SCAT']:
+      np.testing.assert_allclose(spectra[column][i], direct[column], rtol=1e-10, atol=1e-30)
+    np.testing.assert_allclose(spectra['TOT_TRANS'][i], np.exp(-direct['DEPTH']), rtol=1e-10)
+
+###############################################################
+def test_transparentPath():
+  freq = np.array([1000., 2000.])
+  reference = dict([(column, np.full(2, 1e-6)) for column in rangesweep.tape7Columns])
+  reference.update(FREQ=freq, DEPTH=np.zeros(2))
+  spectra = rangesweep.expandRanges(reference, [1., 3.], 1.)
+  #the path radiance of a transparent path is linear in the range
+  np.testing.assert_allclose(spectra['PTH_THRML'], [[1e-6, 1e-6], [3e-6, 3e-6]])
+  np.testing.assert_allclose(spectra['TOT_TRANS'], 1.)
+  assert np.isfinite(spectra['TOTAL_RAD']).all()
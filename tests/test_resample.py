@@ -0,0 +1,46 @@
+import numpy as np
+
+import stdatmos.resample as resample
+import stdatmos.stubmodtran as stubmodtran
+
+###############################################################
+def stubSpectra():
+  """Returns the wavenumber grid and the stub transmittance and path
+  radiance, (2, nfreq)
+  """
+  data = stubmodtran.stubSpectra(0., 45., 1800., 3000., 2.5)
+  columns = stubmodtran.tape7Columns
+  spectra = np.stack([data[:, columns.index('TOT_TRANS')], data[:, columns.index('PTH_THRML')]])
+  return data[:, columns.index('FREQ')], spectra
+
+###############################################################
+def test_interpolation():
+  from scipy.interpolate import interp1d
+  freq, spectra = stubSpectra()
+  #wavelengths on and between the samples, and outside the grid
+  wl = np.concatenate(([3.0], np.linspace(1e4 / freq[-1], 1e4 / freq[0], 777), [6.0]))
+  rs = resample.resampler(freq, wl)
+  expected = interp1d(1e4 / freq, spectra, bounds_error=False, fill_value=0.)(wl)
+  np.testing.assert_allclose(rs.apply(spectra), expected, rtol=1e-12, atol=1e-15)
+  np.testing.assert_allclose(rs.apply(spectra[0]), expected[0], rtol=1e-12, atol=1e-15)
+
+###############################################################
+def test_wavelengthGrid():
+  freq, spectra = stubSpectra()
+  rs = resample.resampler(freq, 300)
+  np.testing.assert_allclose(rs.wl, np.linspace(1e4 / freq[-1], 1e4 / freq[0], 300))
+  #the resampler is calculated once per grid
+  assert resample.resampler(freq.copy(), 300) is rs
+  assert resample.resampler(freq, 300, conserve=True) is not rs
+
+###############################################################
+def test_conserve():
+  freq, spectra = stubSpectra()
+  wlsamples = 1e4 / freq[::-1]
+  rs = resample.resampler(freq, 40, conserve=True)
+  #the bins are halfway between the wavelengths, clipped to the grid
+  edges = np.concatenate(([wlsamples[0]], 0.5 * (rs.wl[1:] + rs.wl[:-1]), [wlsamples[-1]]))
+  integral = np.sum(np.diff(edges) * rs.apply(spectra), axis=-1)
+  np.testing.assert_allclose(integral, np.trapezoid(spectra[:, ::-1], wlsamples), rtol=1e-12)
+  #a constant spectrum stays constant
+  np.testing.assert_allclose(rs.apply(np.ones(freq.shape)), 1., rtol=1e-12)
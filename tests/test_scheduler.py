@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+import time
+import pytest
+
+import stdatmos.runner as runner
+import stdatmos.scheduler as scheduler
+import stdatmos.stubmodtran as stubmodtran
+
+###############################################################
+def crashJob(datadir, *args):
+  """Stands in for scheduler.runJob, kills its worker process
+  """
+  os._exit(1)
+
+###############################################################
+def test_runModtran(elevCases):
+  datadir, = elevCases([30.])
+  result = runner.runModtran(datadir, stubmodtran.stubCommand())
+  assert result.returncode == 0 and not result.timedout and not result.cached
+  assert datadir.endswith(os.path.join('TropicalRural', 'elev', '0', '30.00'))
+  for name in ['tape6', 'tape7', 'modtran.stdout', 'modtran.stderr']:
+    assert os.path.exists(os.path.join(datadir, name))
+
+###############################################################
+def test_runJobsOrder(elevCases):
+  datadirs = elevCases([0., 45., 80., 89., 120.])
+  results = scheduler.runJobs(datadirs, stubmodtran.stubCommand(), nproc=3)
+  assert [result.datadir for result in results] == datadirs
+  assert all([result.returncode == 0 for result in results])
+  for datadir in datadirs:
+    assert os.path.exists(os.path.join(datadir, 'tape6'))
+    assert os.path.exists(os.path.join(datadir, 'tape7'))
+
+###############################################################
+def test_runJobsParallel(elevCases):
+  datadirs = elevCases([0., 30., 60.])
+  t0 = time.perf_counter()
+  results = scheduler.runJobs(datadirs, stubmodtran.stubCommand(delay=1.), nproc=3)
+  walltime = time.perf_counter() - t0
+  assert all([result.returncode == 0 for result in results])
+  #one after another would take more than 3 s
+  assert walltime < 2.5
+
+###############################################################
+def test_timeout(elevCases):
+  datadir, = elevCases([30.])
+  #a tape7 of an earlier run is removed
+  open(os.path.join(datadir, 'tape7'), 'wt').close()
+  result = runner.runModtran(datadir, stubmodtran.stubCommand(delay=10.), timeout=0.5)
+  assert result.returncode is None and result.timedout
+  assert not os.path.exists(os.path.join(datadir, 'tape7'))
+
+###############################################################
+def test_missingExecutable(elevCases, tmp_path):
+  datadir, = elevCases([30.])
+  result = runner.runModtran(datadir, str(tmp_path / 'nomodtran'))
+  assert result.returncode == -1
+  with open(os.path.join(datadir, 'modtran.stderr')) as fin:
+    assert 'nomodtran' in fin.read()
+
+###############################################################
+def test_missingDatadir(elevCases, tmp_path):
+  datadirs = elevCases([0., 45.]) + [str(tmp_path / 'nonexist')]
+  results = scheduler.runJobs(datadirs, stubmodtran.stubCommand(), nproc=2)
+  assert [result.returncode for result in results] == [0, 0, -1]
+
+###############################################################
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason='needs forked workers')
+def test_brokenPool(elevCases, monkeypatch):
+  datadirs = elevCases([0., 30., 45., 60., 80.])
+  #the workers are forked, and find crashJob as scheduler.runJob
+  monkeypatch.setattr(scheduler, 'runJob', crashJob)
+  results = list(scheduler.iterJobs(datadirs, stubmodtran.stubCommand(), nproc=1))
+  assert sorted([result.datadir for result in results]) == sorted(datadirs)
+  assert all([result.returncode == -1 for result in results])
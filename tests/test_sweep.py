@@ -0,0 +1,63 @@
+import json
+import pytest
+
+import stdatmos.sweep as sweep
+
+###############################################################
+def writeSpec(tmp_path, **fields):
+  spec = {'name':'test', 'kind':'elev', 'atmospheres':['A', 'B', 'C'], 'altitudes':[0, 30000],
+    'geometries':{'linspace':[[0, 70, 8], [70, 90, 5]]},
+    'bands':[{'name':'MWIR', 'V1':2000, 'V2':2800, 'DV':1}, {'name':'LWIR', 'V1':800, 'V2':1200, 'DV':1}]}
+  spec.update(fields)
+  filename = str(tmp_path / 'test.json')
+  with open(filename, 'wt') as fout:
+    json.dump(spec, fout)
+  return sweep.readSpec(filename)
+
+###############################################################
+def test_readSpec(tmp_path):
+  spec = writeSpec(tmp_path)
+  #70 is in both linspace segments, and kept once
+  assert spec['geometries'] == [0., 10., 20., 30., 40., 50., 60., 70., 75., 80., 85., 90.]
+  assert sweep.numCases(spec) == 3 * 2 * 12 * 2 == len(list(sweep.allCases(spec)))
+
+###############################################################
+@pytest.mark.parametrize('shardby', ['case', 'atmosphere'])
+@pytest.mark.parametrize('nshards', [1, 2, 3, 5])
+def test_shards(tmp_path, shardby, nshards):
+  spec = writeSpec(tmp_path, shardby=shardby)
+  allcases = list(sweep.allCases(spec))
+  shards = [list(sweep.iterCases(spec, shard, nshards)) for shard in range(nshards)]
+  #disjoint, and together all the cases
+  assert sorted([case for shard in shards for case in shard]) == sorted(allcases)
+  if shardby == 'atmosphere':
+    #each atmosphere, with all its cases, in one shard
+    atmos = [set([case.atmosphere for case in shard]) for shard in shards]
+    assert sorted([atmo for shardatmos in atmos for atmo in shardatmos]) == spec['atmospheres']
+
+###############################################################
+def test_caseList(tmp_path):
+  spec = writeSpec(tmp_path, cases=[['A', 0, 10.], ['B', 30000, 90., 'LWIR']])
+  cases = list(sweep.allCases(spec))
+  assert len(cases) == sweep.numCases(spec) == 2
+  assert cases[1].band['name'] == 'LWIR' and cases[0].band is None
+
+###############################################################
+def test_ledgerResume(tmp_path):
+  spec = writeSpec(tmp_path)
+  ledgerfile = str(tmp_path / sweep.ledgerFile(spec, 1, 2))
+  ledger = sweep.Ledger(ledgerfile)
+  cases = list(sweep.iterCases(spec, 1, 2))
+  for case in cases[:10]:
+    ledger.markDone(sweep.specCaseDir(spec, case))
+  ledger.close()
+
+  #a new ledger, as after a crash, skips the cases that are done
+  ledger = sweep.Ledger(ledgerfile)
+  skip = lambda case: ledger.isDone(sweep.specCaseDir(spec, case))
+  assert list(sweep.iterCases(spec, 1, 2, skip)) == cases[10:]
+  #marking a case again does not add it to the file
+  ledger.markDone(sweep.specCaseDir(spec, cases[0]))
+  ledger.close()
+  with open(ledgerfile, 'rt') as fin:
+    assert len(fin.readlines()) == 10
@@ -0,0 +1,46 @@
+import glob
+import os
+import pytest
+
+import stdatmos.tape5 as tape5
+
+repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+templateFiles = sorted(glob.glob(os.path.join(repoDir, '*', '*.ltn'))
+  + glob.glob(os.path.join(repoDir, '*', '*.tp5')))
+
+###############################################################
+@pytest.mark.parametrize('filename', templateFiles, ids=os.path.basename)
+def test_roundTrip(filename):
+  with open(filename, 'rb') as fin:
+    original = fin.read()
+  assert tape5.readTape5(filename).render().encode() == original
+
+###############################################################
+def test_renderFields():
+  template = tape5.readTape5(os.path.join(repoDir, 'TropicalRural', 'TropicalRural.ltn'))
+  rendered = tape5.Tape5(template.render(H1=12.5, ANGLE=95.25).splitlines())
+  assert rendered['H1'] == 12.5 and rendered['ANGLE'] == 95.25
+  assert rendered['RANGE'] == template['RANGE'] and rendered['V1'] == template['V1']
+
+###############################################################
+def test_tooWide():
+  template = tape5.readTape5(os.path.join(repoDir, 'TropicalRural', 'TropicalRural.ltn'))
+  with pytest.raises(ValueError, match='H1 = .* wider than 10 columns'):
+    template.render(H1=-1.5e12)
+  with pytest.raises(ValueError, match='IRPT = .* wider than 5 columns'):
+    template.render(IRPT=123456)
+  with pytest.raises(ValueError, match='not a field'):
+    template.render(HEIGHT=1.)
+
+###############################################################
+def test_badField(tmp_path):
+  filename = os.path.join(repoDir, 'TropicalRural', 'TropicalRural.ltn')
+  with open(filename, 'rt') as fin:
+    lines = fin.readlines()
+  #a word in the VIS field of CARD2
+  lines[2] = lines[2][:30] + '   clear  ' + lines[2][40:]
+  badfile = str(tmp_path / 'bad.ltn')
+  with open(badfile, 'wt') as fout:
+    fout.writelines(lines)
+  with pytest.raises(ValueError, match=r'bad\.ltn: CARD2 VIS \(columns 31-40\): .* not a number'):
+    tape5.loadTemplate(badfile)